@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from PIL import Image, ImageDraw
+import os
+import random
+
+
+class DatasetSpec:
+    """合成数据集描述"""
+
+    def __init__(self, name, size, format, mode, count):
+        self.name = name
+        self.size = size
+        self.format = format
+        self.mode = mode
+        self.count = count
+
+    @property
+    def extension(self):
+        return {'JPEG': 'jpg', 'PNG': 'png', 'WEBP': 'webp', 'BMP': 'bmp'}[self.format]
+
+    def folder_name(self):
+        return (f"{self.name}_{self.size[0]}x{self.size[1]}_{self.mode}"
+                f"_{self.extension}_{self.count}")
+
+
+# 默认数据集：覆盖常见格式、模式和尺寸
+DEFAULT_SPECS = [
+    DatasetSpec('photo', (6000, 4000), 'JPEG', 'RGB', 8),
+    DatasetSpec('photo', (1920, 1080), 'JPEG', 'RGB', 32),
+    DatasetSpec('screenshot', (2560, 1440), 'PNG', 'RGB', 16),
+    DatasetSpec('sprite', (512, 512), 'PNG', 'RGBA', 64),
+    DatasetSpec('scan', (2480, 3508), 'PNG', 'L', 8),
+    DatasetSpec('web', (1280, 720), 'WEBP', 'RGB', 32),
+]
+
+# 快速模式：数量更少、尺寸更小
+QUICK_SPECS = [
+    DatasetSpec('photo', (1920, 1080), 'JPEG', 'RGB', 8),
+    DatasetSpec('screenshot', (1280, 720), 'PNG', 'RGB', 8),
+    DatasetSpec('sprite', (256, 256), 'PNG', 'RGBA', 16),
+]
+
+
+def make_image(size, mode, seed):
+    """生成带渐变、色块和噪声的图片，压缩率接近真实照片"""
+    rng = random.Random(seed)
+    width, height = size
+
+    gradient = Image.linear_gradient('L').resize(size)
+    base = Image.merge('RGB', (gradient,
+                               gradient.transpose(Image.Transpose.ROTATE_90).resize(size),
+                               Image.new('L', size, rng.randrange(256))))
+
+    draw = ImageDraw.Draw(base)
+    for _ in range(24):
+        x0, y0 = rng.randrange(width), rng.randrange(height)
+        x1, y1 = x0 + rng.randrange(width // 4 + 1), y0 + rng.randrange(height // 4 + 1)
+        color = tuple(rng.randrange(256) for _ in range(3))
+        draw.ellipse((x0, y0, x1, y1), fill=color)
+
+    noise = Image.effect_noise(size, 24).convert('RGB')
+    image = Image.blend(base, noise, 0.15)
+
+    if mode == 'RGBA':
+        image = image.convert('RGBA')
+        image.putalpha(gradient)
+    elif mode != 'RGB':
+        image = image.convert(mode)
+    return image
+
+
+def generate(spec, root):
+    """生成数据集（已存在时直接复用），返回文件夹路径"""
+    folder = os.path.join(root, spec.folder_name())
+    marker = os.path.join(folder, ".complete")
+    if os.path.exists(marker):
+        return folder
+
+    os.makedirs(folder, exist_ok=True)
+    for i in range(spec.count):
+        image = make_image(spec.size, spec.mode, seed=i)
+        path = os.path.join(folder, f"{spec.name}_{i:05d}.{spec.extension}")
+        options = {'quality': 90} if spec.format == 'JPEG' else {}
+        image.save(path, spec.format, **options)
+
+    open(marker, 'w').close()
+    return folder
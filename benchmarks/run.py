@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+性能基准测试
+
+在本地生成合成数据集，测量各热点路径的吞吐量和延迟，输出 JSON，
+并可与保存的基准结果比较。
+
+用法示例：
+    python -m benchmarks.run --quick
+    python -m benchmarks.run --output results.json --save-baseline
+    python -m benchmarks.run --baseline benchmarks/baseline.json
+"""
+import argparse
+import itertools
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+
+import PIL
+
+from benchmarks.datasets import DEFAULT_SPECS, QUICK_SPECS, generate
+from core.batch_processor import BatchProcessor
+from core.batch_stats import percentile
+from core.image_loader import ImageLoader
+from core.image_processor import ImageProcessor, ResizeStage
+from core.thumbnail_store import ThumbnailStore
+from utils.config import Config
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+
+def summarize(latencies, total_seconds, input_bytes):
+    """汇总单个基准的吞吐量和延迟"""
+    count = len(latencies)
+    ordered = sorted(latencies)
+    return {
+        'count': count,
+        'total_s': round(total_seconds, 6),
+        'items_per_s': round(count / total_seconds, 3) if total_seconds else None,
+        'mb_per_s': round(input_bytes / total_seconds / 1e6, 3) if total_seconds else None,
+        'latency_ms': {
+            'p50': round(percentile(ordered, 50) * 1000, 3),
+            'p95': round(percentile(ordered, 95) * 1000, 3),
+            'max': round(ordered[-1] * 1000, 3)
+        }
+    }
+
+
+def time_each(items, func, repeat=1):
+    """对每个条目计时，返回汇总结果"""
+    latencies = []
+    input_bytes = 0
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for item in items:
+            t0 = time.perf_counter()
+            func(item)
+            latencies.append(time.perf_counter() - t0)
+            if isinstance(item, str) and os.path.isfile(item):
+                input_bytes += os.path.getsize(item)
+    return summarize(latencies, time.perf_counter() - start, input_bytes)
+
+
+def bench_scan(folder, work_dir, repeat):
+    """scan_folder：冷扫描（无索引）和热扫描（索引命中）"""
+    loader = ImageLoader()
+    results = {}
+
+    def cold(_):
+        shutil.rmtree(Config.cache_dir("file_index"))
+        loader.scan_folder(folder)
+
+    results['cold'] = time_each([None] * repeat, cold)
+    loader.scan_folder(folder)
+    results['warm'] = time_each([None] * repeat, lambda _: loader.scan_folder(folder))
+    return results
+
+
+def bench_thumbnail(paths, work_dir, repeat):
+    """get_thumbnail_image：首次生成和持久化缓存命中"""
+    store_dir = os.path.join(work_dir, "thumbs")
+    shutil.rmtree(store_dir, ignore_errors=True)
+    loader = ImageLoader(ThumbnailStore(store_dir, ImageLoader.THUMBNAIL_SIZE))
+
+    results = {'cold': time_each(paths, loader.get_thumbnail_image)}
+    loader.flush()
+    loader = ImageLoader(ThumbnailStore(store_dir, ImageLoader.THUMBNAIL_SIZE))
+    results['cached'] = time_each(paths, loader.get_thumbnail_image, repeat)
+    return results
+
+
+def bench_load(paths, work_dir, repeat):
+    """load_image（完整解码）和 load_preview（降低分辨率解码）"""
+    loader = ImageLoader()
+    return {
+        'full': time_each(paths, lambda p: loader.load_image(p).load(), repeat),
+        'preview': time_each(paths, loader.load_preview, repeat)
+    }
+
+
+def bench_display(paths, work_dir, repeat):
+    """PreviewPanel.display_image（离屏 Qt）：首次渲染、旋转和缓存命中"""
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    try:
+        from PyQt5.QtWidgets import QApplication
+    except ImportError:
+        return None
+    from gui.preview_panel import PreviewPanel
+
+    app = QApplication.instance() or QApplication([])
+    panel = PreviewPanel()
+    panel.resize(1000, 800)
+    panel.show()
+    app.processEvents()
+
+    loader = ImageLoader()
+    previews = [(path, loader.load_preview(path)) for path in paths]
+
+    def show(item):
+        path, (image, source_size) = item
+        panel.set_image(image, path, True, 0, 0, 1, source_size)
+
+    def rotate(item):
+        show(item)
+        panel.rotate_image(90)
+
+    results = {'render': time_each(previews, show)}
+    results['rotate'] = time_each(previews, rotate)
+    results['cached'] = time_each(previews, show, repeat)
+    panel.close()
+    return results
+
+
+def bench_batch(paths, work_dir, repeat):
+    """BatchProcessor.process_image：缩放+旋转重新编码、各重采样配置缩小到 512 px，以及直接复制"""
+    output = os.path.join(work_dir, "batch_output")
+    results = {}
+    cases = {
+        'scale50_rot90_png': (50, 90, 'png'),
+        'scale50_jpg': (50, 0, 'jpg'),
+        'max512_best_jpg': (ResizeStage(mode='max_side', target=512, profile='best'), 0, 'jpg'),
+        'max512_balanced_jpg': (ResizeStage(mode='max_side', target=512, profile='balanced'),
+                                0, 'jpg'),
+        'max512_fast_jpg': (ResizeStage(mode='max_side', target=512, profile='fast'), 0, 'jpg'),
+        'copy': (100, 0, None)
+    }
+    for name, (resize, rotation, output_format) in cases.items():
+        shutil.rmtree(output, ignore_errors=True)
+        os.makedirs(output)
+        processor = BatchProcessor()
+        numbers = itertools.count(1)
+
+        def process(path):
+            fmt = output_format or os.path.splitext(path)[1][1:].lower()
+            processor.process_image(path, output, 'bench_', next(numbers), 6,
+                                    resize, rotation, fmt, 90)
+            processor.log_records.clear()
+            processor.timings.clear()
+
+        results[name] = time_each(paths, process, repeat)
+    return results
+
+
+def bench_encode(paths, work_dir, repeat):
+    """ImageProcessor.encode_image：各输出格式在各编码配置下的速度和平均大小"""
+    images = [ImageProcessor.build_pipeline(100, 0).apply(ImageLoader().load_image(p))
+              for p in paths]
+    results = {}
+    for output_format in ('png', 'jpg', 'webp'):
+        for profile in ImageProcessor.ENCODER_PROFILES:
+            sizes = []
+
+            def encode(image):
+                sizes.append(len(ImageProcessor.encode_image(image, output_format, 90, profile)))
+
+            summary = time_each(images, encode, repeat)
+            summary['bytes_per_image'] = sum(sizes) // len(sizes)
+            results[f"{output_format}_{profile}"] = summary
+    return results
+
+
+BENCHMARKS = {
+    'scan_folder': bench_scan,
+    'get_thumbnail': bench_thumbnail,
+    'load_image': bench_load,
+    'display_image': bench_display,
+    'process_image': bench_batch,
+    'encode': bench_encode
+}
+
+
+def run(specs, data_root, work_dir, repeat, selected):
+    """运行所有基准，返回结果字典"""
+    results = {}
+    for spec in specs:
+        folder = generate(spec, data_root)
+        paths = ImageLoader().scan_folder(folder)
+        print(f"[{spec.folder_name()}]", file=sys.stderr)
+
+        for name, bench in BENCHMARKS.items():
+            if selected and name not in selected:
+                continue
+            target = folder if name == 'scan_folder' else paths
+            result = bench(target, work_dir, repeat)
+            if result is None:
+                print(f"  {name}: 跳过（缺少依赖）", file=sys.stderr)
+                continue
+            for case, summary in result.items():
+                key = f"{spec.folder_name()}/{name}/{case}"
+                results[key] = summary
+                print(f"  {name}/{case}: {summary['items_per_s']} items/s, "
+                      f"p50 {summary['latency_ms']['p50']} ms", file=sys.stderr)
+    return results
+
+
+def compare(results, baseline, threshold):
+    """与基准比较吞吐量，返回 (比较结果, 是否有退化)"""
+    comparison = {}
+    regressed = False
+    for key, summary in results.items():
+        base = baseline.get('results', {}).get(key)
+        if not base or not base.get('items_per_s') or not summary.get('items_per_s'):
+            continue
+        ratio = summary['items_per_s'] / base['items_per_s']
+        status = 'ok'
+        if ratio < 1 - threshold:
+            status = 'regression'
+            regressed = True
+        elif ratio > 1 + threshold:
+            status = 'improvement'
+        comparison[key] = {
+            'baseline_items_per_s': base['items_per_s'],
+            'items_per_s': summary['items_per_s'],
+            'ratio': round(ratio, 3),
+            'status': status
+        }
+    return comparison, regressed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="数据集图片预处理工具性能基准")
+    parser.add_argument('--quick', action='store_true', help="使用较小的数据集")
+    parser.add_argument('--repeat', type=int, default=3, help="缓存命中类基准的重复次数")
+    parser.add_argument('--only', nargs='*', choices=list(BENCHMARKS), help="只运行指定基准")
+    parser.add_argument('--data-dir', help="合成数据集目录（默认在临时目录中，可复用）")
+    parser.add_argument('--output', help="结果 JSON 输出路径（默认输出到标准输出）")
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help="基准结果 JSON")
+    parser.add_argument('--save-baseline', action='store_true', help="将本次结果保存为基准")
+    parser.add_argument('--threshold', type=float, default=0.1, help="判定退化的吞吐量下降比例")
+    args = parser.parse_args(argv)
+
+    specs = QUICK_SPECS if args.quick else DEFAULT_SPECS
+    data_root = args.data_dir or os.path.join(tempfile.gettempdir(), "dataset_image_processor_bench")
+    work_dir = tempfile.mkdtemp(prefix="dip_bench_")
+
+    # 缓存目录指向临时目录，不影响用户缓存
+    Config.CACHE_ROOT = os.path.join(work_dir, "cache")
+    try:
+        results = run(specs, data_root, work_dir, args.repeat, args.only)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    report = {
+        'environment': {
+            'python': platform.python_version(),
+            'pillow': PIL.__version__,
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count()
+        },
+        'results': results
+    }
+
+    regressed = False
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        report['comparison'], regressed = compare(results, baseline, args.threshold)
+
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            f.write(json.dumps(report, indent=2, ensure_ascii=False) + "\n")
+        print(f"基准已保存: {args.baseline}", file=sys.stderr)
+
+    return 1 if regressed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,285 @@
+"""
+数据集图片预处理工具
+命令行入口（无界面，不加载 Qt）
+
+用法示例：
+    python cli.py -i ./raw -o ./dataset --scale-percent 50 --workers 16
+    python cli.py --settings settings.json --decisions decisions.json
+    python cli.py -i ./raw -o ./dataset --work-shard 0/4   # 在 4 个节点上分别运行 0/4 … 3/4
+    python cli.py -o ./dataset --merge-logs
+"""
+import argparse
+import json
+import os
+import sys
+
+from core.image_loader import ImageLoader
+from core.image_processor import ImageProcessor, ResizeStage
+from core.output_sink import merge_shard_manifests
+from core.processing_log import merge_logs
+from core.work_shard import parse_work_shard, select_work_shard
+from PIL import Image
+from core.batch_processor import create_processor
+from core.curation_state import CurationState
+from core.dedupe import find_duplicates
+from utils.logger import Logger
+
+# 与 SettingsPanel 的默认值保持一致
+DEFAULT_SETTINGS = {
+    'input_folder': '',
+    'output_folder': '',
+    'resize_mode': 'percent',
+    'scale_percent': 50,
+    'target_size': 512,
+    'target_width': 512,
+    'target_height': 512,
+    'resample': 'balanced',
+    'output_format': 'png',
+    'quality': 95,
+    'encoder_profile': 'balanced',
+    'lossless': False,
+    'prefix': 'train_',
+    'start_number': 1,
+    'padding': 5,
+    'output_sink': 'files',
+    'shard_size_mb': 1024,
+    'workers': os.cpu_count() or 1,
+    'streaming': False,
+    'io_threads': 4,
+    'work_shard': 0,
+    'work_shards': 1,
+    'resume': True,
+    'profile': False
+}
+
+
+def parse_args(argv=None):
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description="数据集图片批量预处理（命令行模式）")
+    parser.add_argument('-i', '--input-folder', dest='input_folder', help="输入文件夹")
+    parser.add_argument('-o', '--output-folder', dest='output_folder', help="输出文件夹")
+    parser.add_argument('--resize-mode', dest='resize_mode',
+                        choices=['percent', 'max_side', 'short_side', 'exact'],
+                        help="缩放方式：等比例、最长边、最短边或指定尺寸")
+    parser.add_argument('--scale-percent', dest='scale_percent', type=float, help="等比例缩放百分比")
+    parser.add_argument('--target-size', dest='target_size', type=int,
+                        help="最长边/最短边的目标长度（像素）")
+    parser.add_argument('--target-width', dest='target_width', type=int, help="指定尺寸的宽度")
+    parser.add_argument('--target-height', dest='target_height', type=int, help="指定尺寸的高度")
+    parser.add_argument('--resample', choices=['fast', 'balanced', 'best'],
+                        help="重采样配置（速度/质量）")
+    parser.add_argument('--output-format', dest='output_format', choices=['png', 'jpg', 'jpeg', 'webp'],
+                        help="输出格式")
+    parser.add_argument('--quality', type=int, help="JPEG/WebP 质量")
+    parser.add_argument('--encoder-profile', dest='encoder_profile',
+                        choices=['fastest', 'balanced', 'smallest'], help="编码配置（速度/大小）")
+    parser.add_argument('--lossless', action='store_true', default=None, help="WebP 无损压缩")
+    parser.add_argument('--compare-encoders', dest='compare_encoders', type=int, metavar='N',
+                        help="抽取 N 张图片按当前设置处理，比较各编码配置的大小和耗时后退出")
+    parser.add_argument('--prefix', help="文件名前缀")
+    parser.add_argument('--start-number', dest='start_number', type=int, help="起始序号")
+    parser.add_argument('--padding', type=int, help="补零位数")
+    parser.add_argument('--shards', dest='output_sink', action='store_const', const='shards',
+                        help="输出为分片 tar 归档（不支持续跑）")
+    parser.add_argument('--shard-size', dest='shard_size_mb', type=int,
+                        help="每个分片的最大大小（MB）")
+    parser.add_argument('--workers', type=int, help="并行进程数")
+    parser.add_argument('--streaming', action='store_true', default=None,
+                        help="流水线处理：预读源文件、异步写出结果（适合网络存储）")
+    parser.add_argument('--io-threads', dest='io_threads', type=int,
+                        help="流水线处理的读取/写入线程数")
+    parser.add_argument('--work-shard', dest='work_shard_spec', type=_work_shard_arg,
+                        metavar='K/N',
+                        help="多节点处理：只处理 N 个分片中的第 K 个（0 <= K < N），序号与整体处理一致")
+    parser.add_argument('--merge-logs', action='store_true',
+                        help="合并输出文件夹中各分片的处理日志，生成 processed_log.txt 等")
+    parser.add_argument('--no-resume', dest='resume', action='store_false', default=None,
+                        help="重新处理所有图片（默认跳过上次已完成的图片）")
+    parser.add_argument('--profile', action='store_true', default=None,
+                        help="记录各处理阶段的耗时，保存到 processing_stats.json")
+    parser.add_argument('--settings', help="设置 JSON 文件（键与界面设置相同）")
+    parser.add_argument('--decisions', help="保留/旋转决定 JSON 文件或界面保存的会话文件")
+    parser.add_argument('--dedupe', action='store_true',
+                        help="跳过近似重复的图片（每组保留第一张，需要 numpy）")
+    parser.add_argument('-q', '--quiet', action='store_true', help="不显示进度")
+    return parser.parse_args(argv)
+
+
+def _work_shard_arg(text):
+    try:
+        return parse_work_shard(text)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
+def load_settings(args):
+    """合并默认值、设置文件和命令行参数"""
+    settings = dict(DEFAULT_SETTINGS)
+
+    if args.settings:
+        with open(args.settings, 'r', encoding='utf-8') as f:
+            settings.update(json.load(f))
+
+    for key in DEFAULT_SETTINGS:
+        value = getattr(args, key, None)
+        if value is not None:
+            settings[key] = value
+
+    if args.work_shard_spec:
+        settings['work_shard'], settings['work_shards'] = args.work_shard_spec
+    settings['output_format'] = settings['output_format'].lower()
+    if float(settings['scale_percent']).is_integer():
+        settings['scale_percent'] = int(settings['scale_percent'])
+    return settings
+
+
+def load_decisions(path, input_folder):
+    """加载保留/旋转决定
+
+    支持两种 JSON 格式：
+        [{"path": ..., "keep": true, "rotation": 90}, ...]
+        {"<path>": {"keep": true, "rotation": 90}, ...}
+    相对路径以输入文件夹为基准。也可以直接使用界面保存的会话文件。
+    返回 {绝对路径: (是否保留, 旋转角度)}。
+    """
+    state = CurationState.load(path, readonly=True)
+    if state is not None:
+        decisions = {os.path.abspath(state.path(i)): (state.is_kept(i), state.get_rotation(i))
+                     for i in range(len(state))}
+        return decisions
+
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+
+    if isinstance(data, dict):
+        data = [dict(value, path=key) for key, value in data.items()]
+
+    decisions = {}
+    for item in data:
+        item_path = os.path.abspath(os.path.join(input_folder, item['path']))
+        decisions[item_path] = (item.get('keep', True), item.get('rotation', 0) % 360)
+    return decisions
+
+
+def compare_encoders(images, settings, count, quiet=False):
+    """均匀抽取 count 张图片按当前设置处理，比较各编码配置，结果以 JSON 输出"""
+    step = max(1, len(images) // count)
+    resize = ResizeStage.from_settings(settings)
+    processed = []
+    for path, rotation in images[::step][:count]:
+        pipeline = ImageProcessor.build_pipeline(resize, rotation)
+        processed.append(pipeline.apply(Image.open(path)))
+
+    report = ImageProcessor.compare_encoder_profiles(
+        processed, settings['output_format'], settings['quality'], settings['lossless'])
+
+    if not quiet:
+        print(f"{settings['output_format']}，{len(processed)} 张：", file=sys.stderr)
+        for profile, stats in report.items():
+            print(f"  {profile:<9} {stats['bytes_per_image'] / 1024:10.1f} KB/张"
+                  f"  {stats['ms_per_image']:8.1f} ms/张", file=sys.stderr)
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    return 0
+
+
+def merge_shard_logs(output_folder, quiet=False):
+    """合并各分片的处理日志和分片归档清单"""
+    try:
+        summary = merge_logs(output_folder)
+    except (OSError, ValueError) as e:
+        print(f"错误：{e}", file=sys.stderr)
+        return 1
+    merge_shard_manifests(output_folder)
+
+    if not quiet and summary['missing']:
+        print(f"缺少分片: {', '.join(map(str, summary['missing']))}", file=sys.stderr)
+    if not quiet and (summary['gaps'] or summary['duplicates']):
+        print(f"序号有 {summary['gaps']} 处缺失、{summary['duplicates']} 处重复，"
+              f"请确认各节点使用相同的输入、决定和设置", file=sys.stderr)
+    print(f"合并完成: {summary['parts']} 个分片，处理 {summary['processed']} 张，"
+          f"跳过 {summary['skipped']} 张")
+    complete = not (summary['missing'] or summary['gaps'] or summary['duplicates'])
+    return 0 if complete else 1
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    settings = load_settings(args)
+
+    if args.merge_logs:
+        if not settings['output_folder']:
+            print("错误：必须指定输出文件夹", file=sys.stderr)
+            return 2
+        return merge_shard_logs(settings['output_folder'], args.quiet)
+
+    if args.compare_encoders and not settings['output_folder']:
+        settings['output_folder'] = '.'
+    if not settings['input_folder'] or not settings['output_folder']:
+        print("错误：必须指定输入和输出文件夹", file=sys.stderr)
+        return 2
+
+    image_files = ImageLoader().scan_folder(settings['input_folder'])
+    if not image_files:
+        print("未找到任何图片文件！", file=sys.stderr)
+        return 1
+
+    # 过滤保留的图片
+    decisions = {}
+    if args.decisions:
+        decisions = load_decisions(args.decisions, settings['input_folder'])
+
+    duplicates = set()
+    if args.dedupe:
+        loader = ImageLoader()
+        try:
+            for group in find_duplicates(loader, image_files):
+                duplicates.update(group[1:])
+        finally:
+            # 保存新生成的缩略图，下次运行和界面可以直接复用
+            loader.flush()
+        if not args.quiet:
+            print(f"跳过 {len(duplicates)} 张重复图片", file=sys.stderr)
+
+    images_to_process = []
+    for i, path in enumerate(image_files):
+        keep, rotation = decisions.get(os.path.abspath(path), (True, 0))
+        if keep and i not in duplicates:
+            images_to_process.append((path, rotation))
+
+    if not images_to_process:
+        print("没有标记为保留的图片！", file=sys.stderr)
+        return 1
+
+    if args.compare_encoders:
+        return compare_encoders(images_to_process, settings, args.compare_encoders, args.quiet)
+
+    # 多节点处理时只处理本节点的分片，序号按全部保留图片中的位置计算
+    total = len(images_to_process)
+    images_to_process, settings = select_work_shard(images_to_process, settings)
+    if settings['work_shards'] > 1 and not args.quiet:
+        first = settings['start_number']
+        print(f"分片 {settings['work_shard']}/{settings['work_shards']}: "
+              f"{len(images_to_process)}/{total} 张，序号 {first}-{first + len(images_to_process) - 1}",
+              file=sys.stderr)
+
+    os.makedirs(settings['output_folder'], exist_ok=True)
+
+    def on_progress(done, total):
+        if not args.quiet and (done == total or done % 100 == 0):
+            print(f"\r处理进度: {done}/{total}", end='', file=sys.stderr, flush=True)
+
+    if settings['profile']:
+        Logger.setup()
+
+    processor = create_processor(settings)
+    success_count = processor.process_batch(images_to_process, settings, on_progress)
+    processor.save_logs(settings['output_folder'])
+
+    if not args.quiet:
+        print(file=sys.stderr)
+    print(f"处理完成: {success_count}/{len(images_to_process)} 张图片")
+    return 0 if success_count == len(images_to_process) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
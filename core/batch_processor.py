@@ -1,76 +1,636 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-from core.image_processor import ImageProcessor
-from PIL import Image
+from core.batch_stats import BatchStats, ImageTiming, NULL_TIMING
+from core.image_processor import ImageProcessor, ResizeStage
+from core.manifest import RunManifest
+from core.output_sink import FileSink, MemorySink, create_sink
+from core.processing_log import (ProcessingLog, processed_record, skipped_record,
+                                 write_text_logs)
+from core.work_shard import shard_tag
+from utils.logger import Logger
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from collections import deque
+from PIL import Image, UnidentifiedImageError
+import io
 import os
+import queue
+import threading
+import time
 
 
 class BatchProcessor:
-    """批量处理器"""
+    """批量处理器
 
-    def __init__(self):
+    输出写入 sink（默认为输出文件夹中的单独文件，也可以是分片归档）。
+    每张图片的处理结果先记入 log_records，process_batch 逐张写入
+    输出文件夹中的 processing_log.jsonl，save_logs 再由它生成文本日志。
+    instrument 为 True 时记录每张图片各阶段（打开、解码、各变换、编码、写入）
+    的耗时和字节数，save_logs 时写出汇总统计。
+    多节点分片处理（设置 work_shard/work_shards）时，处理日志、完成清单和统计
+    使用带分片标记的文件名，文本日志由合并步骤（merge_logs）生成。
+    """
+
+    def __init__(self, instrument=False):
         self.processor = ImageProcessor()
-        self.processed_log = []
-        self.skipped_log = []
+        self.log_records = []  # 尚未写入处理日志的记录
+        self.log = None
+        self.instrument = instrument
+        self.timings = []  # 尚未汇总的单张图片耗时记录
+        self.stats = None
+        self.sink = None
+        self.tag = ''
+        self.cancelled = threading.Event()
 
-    def process_image(self, input_path, output_folder, prefix, number, padding,
-                      scale_percent, rotation, output_format, quality):
-        """处理单张图片"""
-        try:
-            # 加载图片
-            image = Image.open(input_path)
-            if image.mode != 'RGB':
-                image = image.convert('RGB')
+    def cancel(self):
+        """请求取消批量处理（可从其他线程调用）
 
-            # 旋转
-            if rotation != 0:
-                image = self.processor.rotate_image(image, rotation)
+        不再开始新的图片，process_batch 在已开始的图片完成并写入日志和完成清单后返回。
+        """
+        self.cancelled.set()
 
-            # 缩放
-            if scale_percent != 100:
-                image = self.processor.resize_image(image, scale_percent)
+    def process_image(self, input_path, output_folder, prefix, number, padding,
+                      resize, rotation, output_format, quality, encoder_profile='balanced',
+                      lossless=False, data=None):
+        """处理单张图片
+
+        resize 为 ResizeStage 或缩放百分比；encoder_profile 和 lossless 见
+        ImageProcessor.encode_image。data 为已读入的源文件内容，为 None 时从
+        input_path 读取。
+        """
+        timing = ImageTiming(input_path) if self.instrument else NULL_TIMING
+        try:
+            # 加载图片（只读取文件头）
+            with timing.stage('open'):
+                image = _open_image(input_path, data)
+            timing.count_input(input_path, None if data is None else len(data))
 
             # 生成输出文件名
-            output_filename = f"{prefix}{str(number).zfill(padding)}.{output_format}"
-            output_path = os.path.join(output_folder, output_filename)
+            output_filename = make_output_filename(prefix, number, padding, output_format)
+            sink = self.sink or FileSink(output_folder)
 
-            # 保存
-            success = self.processor.save_image(image, output_path, output_format, quality)
+            if not isinstance(resize, ResizeStage):
+                resize = ResizeStage(resize)
+            pipeline = self.processor.build_pipeline(resize, rotation)
+            scale = resize.describe()
 
-            if success:
-                log_entry = (f"{input_path} → {output_filename} → "
-                             f"scaled {scale_percent}%, rotated {rotation}°")
-                self.processed_log.append(log_entry)
+            # 无需任何变换时直接复制原文件
+            if self.processor.can_copy(image, pipeline, output_format):
+                image.close()
+                with timing.stage('write'):
+                    if data is None:
+                        size = sink.copy(output_filename, input_path, number)
+                    else:
+                        sink.write(output_filename, data, number)
+                        size = len(data)
+                timing.count_output(size)
+                self._add_timing(timing)
+                self.log_records.append(processed_record(
+                    number, input_path, output_filename, scale, rotation))
                 return True
-            else:
-                self.skipped_log.append(input_path)
-                return False
+
+            # 解码、转换、旋转、缩放（由流水线决定实际顺序）
+            image = pipeline.apply(image, timing)
+
+            # 编码并保存
+            with timing.stage('encode'):
+                data = self.processor.encode_image(image, output_format, quality,
+                                                   encoder_profile, lossless)
+            with timing.stage('write'):
+                sink.write(output_filename, data, number)
+            timing.count_output(len(data))
+
+            self._add_timing(timing)
+            self.log_records.append(processed_record(
+                number, input_path, output_filename, scale, rotation))
+            return True
 
         except Exception as e:
             print(f"Error processing {input_path}: {e}")
-            self.skipped_log.append(f"{input_path} → Error:  {str(e)}")
+            self.log_records.append(skipped_record(number, input_path, str(e)))
             return False
 
+    def _add_timing(self, timing):
+        """保存成功处理的图片的耗时记录"""
+        if timing is not NULL_TIMING:
+            self.timings.append(timing.to_record())
+
+    def _collect(self, log_records, timings, outputs=()):
+        """将子进程暂存的输出写入 sink，日志写入处理日志，耗时记录汇总到统计中"""
+        for name, data, number in outputs:
+            self.sink.write(name, data, number)
+        for record in log_records:
+            self.log.write(record)
+        if self.stats is not None:
+            for record in timings:
+                self.stats.add(record)
+        self.log_records.clear()
+        self.timings.clear()
+
+    def process_batch(self, images, settings, progress_callback=None):
+        """按顺序处理图片列表
+
+        images 为 [(path, rotation), ...]，第 i 张的序号为 start_number + i。
+        progress_callback(done, total) 返回 False 或调用 cancel 时取消剩余任务。
+        返回成功处理的数量（包括上次运行已完成而跳过的图片）。
+        """
+        manifest, reused = self._begin_batch(images, settings)
+        success_count = 0
+        total = len(images)
+        try:
+            for i, (path, rotation) in enumerate(images):
+                if self.cancelled.is_set():
+                    break
+                if i in reused:
+                    self._reuse_output(settings, i, path, rotation, reused[i])
+                    success = True
+                else:
+                    success = self.process_image(*_task_args(settings, i, path, rotation))
+                    self._collect(self.log_records, self.timings)
+                    self._record_output(manifest, settings, i, path, rotation, success)
+                if success:
+                    success_count += 1
+                if progress_callback and progress_callback(i + 1, total) is False:
+                    break
+        finally:
+            self._end_batch(manifest)
+        return success_count
+
+    def _begin_batch(self, images, settings):
+        """打开完成清单并找出可复用的输出
+
+        返回 (清单, {任务索引: 输出文件名})；未启用续跑时清单为 None。
+        序号发生变化的已有输出会先被重命名为新的文件名。
+        """
+        self.tag = shard_tag(settings)
+        self.log = ProcessingLog(settings['output_folder'], self.tag)
+        self.stats = BatchStats() if self.instrument else None
+        self.sink = create_sink(settings)
+        # 分片归档每次重新生成，不支持续跑
+        if not settings.get('resume', True) or self.sink.ordered:
+            return None, {}
+
+        manifest = RunManifest(settings['output_folder'], self.tag)
+        hashes = {}
+        found = []
+        for path, rotation in images:
+            if rotation not in hashes:
+                hashes[rotation] = manifest.settings_hash(settings, rotation)
+            found.append(manifest.find(path, hashes[rotation]))
+
+        # 先查找全部输入再释放文件名：插入新图片后序号后移，
+        # 边查找边释放会使后面的输入在查找前失去原有记录
+        reused = {}
+        moves = []
+        for i, (path, _) in enumerate(images):
+            name = _output_name(settings, i)
+            if found[i] == name:
+                reused[i] = name
+                continue
+
+            # 该文件名将被重新写入或移入，原有记录失效
+            manifest.release(name)
+            if found[i] is not None:
+                manifest.release(found[i])
+                moves.append((i, path, found[i], name))
+
+        if moves:
+            manifest.sync()
+            relocated = manifest.relocate([(path, old, new) for _, path, old, new in moves])
+            relocated = set(relocated)
+            for i, path, _, name in moves:
+                if (path, name) in relocated:
+                    manifest.record(path, name, hashes[images[i][1]])
+                    reused[i] = name
+            manifest.sync()
+
+        return manifest, reused
+
+    def _end_batch(self, manifest):
+        """关闭完成清单、输出目标和处理日志"""
+        if manifest is not None:
+            manifest.close()
+        self.sink.close()
+        self.sink = None
+        self.log.close()
+        self.cancelled.clear()
+        if self.stats is not None:
+            self.stats.finish()
+
+    def _reuse_output(self, settings, i, path, rotation, output_name):
+        """记录直接复用的输出"""
+        if self.stats is not None:
+            self.stats.reused += 1
+        self.log.write(processed_record(settings['start_number'] + i, path, output_name,
+                                        ResizeStage.from_settings(settings).describe(),
+                                        rotation, reused=True))
+
+    def _record_output(self, manifest, settings, i, path, rotation, success):
+        """处理成功后写入完成清单"""
+        if manifest is not None and success:
+            manifest.record(path, _output_name(settings, i),
+                            manifest.settings_hash(settings, rotation))
+
     def save_logs(self, output_folder):
-        """保存日志文件"""
-        # 保存处理日志
-        log_path = os.path.join(output_folder, "processed_log.txt")
-        with open(log_path, 'w', encoding='utf-8') as f:
-            f.write("处理日志\n")
-            f.write("=" * 80 + "\n\n")
-            for entry in self.processed_log:
-                f.write(entry + "\n")
-
-        # 保存跳过日志
-        if self.skipped_log:
-            skip_path = os.path.join(output_folder, "skipped_files.txt")
-            with open(skip_path, 'w', encoding='utf-8') as f:
-                f.write("跳过的文件\n")
-                f.write("=" * 80 + "\n\n")
-                for entry in self.skipped_log:
-                    f.write(entry + "\n")
-
-        # 清空日志
-        self.processed_log.clear()
-        self.skipped_log.clear()
\ No newline at end of file
+        """由处理日志生成 processed_log.txt 和 skipped_files.txt，并保存耗时统计
+
+        分片处理时只保存统计，文本日志在合并各分片日志时生成。
+        """
+        if not self.tag:
+            write_text_logs(output_folder)
+
+        # 保存耗时统计
+        if self.stats is not None and (self.stats.count or self.stats.reused):
+            summary = self.stats.save(output_folder, self.tag)
+            for line in BatchStats.format_summary(summary):
+                Logger.info(line)
+        self.stats = None
+
+
+class ParallelBatchProcessor(BatchProcessor):
+    """多进程批量处理器
+
+    解码、旋转、缩放和编码在进程池中并行执行，结果与日志按输入顺序收集，
+    因此输出序号和日志内容与顺序处理完全一致。
+    """
+
+    POLL_INTERVAL = 0.1  # 等待结果时检查取消请求的间隔（秒）
+
+    def __init__(self, workers=None, instrument=False):
+        super().__init__(instrument)
+        self.workers = max(1, workers or os.cpu_count() or 1)
+
+    def _wait_result(self, future):
+        """等待任务结果，期间请求取消时返回 None"""
+        while True:
+            try:
+                return future.result(timeout=self.POLL_INTERVAL)
+            except FutureTimeout:
+                if self.cancelled.is_set():
+                    return None
+
+    def process_batch(self, images, settings, progress_callback=None):
+        """并行处理图片列表"""
+        if self.workers == 1 or len(images) <= 1:
+            return super().process_batch(images, settings, progress_callback)
+
+        manifest, reused = self._begin_batch(images, settings)
+        success_count = 0
+        total = len(images)
+        # 限制已提交但未收集的任务数，取消时只需丢弃少量任务
+        max_pending = self.workers * 4
+        pending = deque()  # (任务索引, future)，复用的输出没有 future
+        tasks = iter(enumerate(images))
+        done = 0
+
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            try:
+                while not self.cancelled.is_set():
+                    while len(pending) < max_pending:
+                        item = next(tasks, None)
+                        if item is None:
+                            break
+                        i, (path, rotation) = item
+                        if i in reused:
+                            pending.append((i, None))
+                            continue
+                        pending.append((i, executor.submit(
+                            _process_task, _task_args(settings, i, path, rotation),
+                            self.instrument, self.sink.ordered)))
+                    if not pending:
+                        break
+
+                    # 按提交顺序收集结果
+                    i, future = pending.popleft()
+                    path, rotation = images[i]
+                    if future is None:
+                        self._reuse_output(settings, i, path, rotation, reused[i])
+                        success = True
+                    else:
+                        result = self._wait_result(future)
+                        if result is None:
+                            pending.appendleft((i, future))
+                            break
+                        success, log_records, timings, outputs = result
+                        self._collect(log_records, timings, outputs)
+                        self._record_output(manifest, settings, i, path, rotation, success)
+                    if success:
+                        success_count += 1
+                    done += 1
+
+                    if progress_callback and progress_callback(done, total) is False:
+                        break
+                success_count += self._commit_started(pending, images, settings, manifest)
+            finally:
+                executor.shutdown(cancel_futures=True)
+                self._end_batch(manifest)
+
+        return success_count
+
+    def _commit_started(self, pending, images, settings, manifest):
+        """取消后提交已开始处理的图片，返回其中成功的数量
+
+        尚未开始的任务被取消；已开始的任务会写入输出，等待完成后按顺序写入日志和完成清单，
+        避免输出目录中留下没有记录的文件。
+        """
+        for _, future in pending:
+            if future is not None:
+                future.cancel()
+
+        success_count = 0
+        for i, future in pending:
+            if future is None or future.cancelled():
+                continue
+            path, rotation = images[i]
+            try:
+                success, log_records, timings, outputs = future.result()
+            except Exception as e:
+                print(f"Error processing {path}: {e}")
+                continue
+            self._collect(log_records, timings, outputs)
+            self._record_output(manifest, settings, i, path, rotation, success)
+            if success:
+                success_count += 1
+        pending.clear()
+        return success_count
+
+
+class _StreamTask:
+    """流水线中的一张图片"""
+
+    __slots__ = ('index', 'path', 'rotation', 'reused', 'data', 'result',
+                 'read_s', 'write_s')
+
+    def __init__(self, index, path, rotation, reused=False):
+        self.index = index
+        self.path = path
+        self.rotation = rotation
+        self.reused = reused
+        self.data = None  # 读入的源文件内容
+        self.result = None  # (成功, 日志记录, 耗时记录, 待写入的输出)
+        self.read_s = None
+        self.write_s = None
+
+
+class StreamingBatchProcessor(ParallelBatchProcessor):
+    """流水线批量处理器
+
+    处理分为三级，各级之间以有界队列连接：
+        读取线程（预读源文件） → 变换线程（在进程池中解码、变换、编码） → 写入线程
+    网络存储上读写文件的等待与 CPU 计算重叠。下游处理不及时上游会在队列上阻塞，
+    同时在流水线中的图片不超过 max_in_flight 张，内存占用与图片总数无关。
+    日志、完成清单和进度由主线程按输入顺序提交；要求按顺序写入的输出目标
+    （分片归档）也由主线程在提交时写入。取消后输出已写入的图片在流水线排空后
+    按顺序提交，其余的丢弃。
+    """
+
+    def __init__(self, workers=None, io_threads=4, instrument=False):
+        super().__init__(workers, instrument)
+        self.io_threads = max(1, io_threads)
+
+    @property
+    def max_in_flight(self):
+        return (self.workers + self.io_threads) * 2
+
+    def process_batch(self, images, settings, progress_callback=None):
+        """以流水线方式处理图片列表，结果与顺序处理一致"""
+        manifest, reused = self._begin_batch(images, settings)
+        ordered = self.sink.ordered
+        window = threading.Semaphore(self.max_in_flight)
+        stop = threading.Event()
+        read_queue = queue.Queue(self.io_threads * 2)
+        transform_queue = queue.Queue(self.workers * 2)
+        write_queue = queue.Queue(self.io_threads * 2)
+        done_queue = queue.Queue()  # 元素数受 window 限制
+
+        def feed():
+            for i, (path, rotation) in enumerate(images):
+                window.acquire()
+                if stop.is_set():
+                    window.release()
+                    break
+                if i in reused:
+                    done_queue.put(_StreamTask(i, path, rotation, reused=True))
+                else:
+                    read_queue.put(_StreamTask(i, path, rotation))
+            for _ in range(self.io_threads):
+                read_queue.put(None)
+
+        def read(task):
+            if stop.is_set():
+                return
+            start = time.perf_counter()
+            with open(task.path, 'rb') as f:
+                task.data = f.read()
+            task.read_s = time.perf_counter() - start
+
+        def transform(task):
+            if stop.is_set() or task.result is not None:
+                return
+            data, task.data = task.data, None
+            future = executor.submit(
+                _process_task, _task_args(settings, task.index, task.path, task.rotation),
+                self.instrument, True, data)
+            task.result = future.result()
+
+        def write(task):
+            if ordered or stop.is_set() or task.result is None:
+                return
+            success, log_records, timings, outputs = task.result
+            start = time.perf_counter()
+            for name, data, number in outputs:
+                self.sink.write(name, data, number)
+            task.write_s = time.perf_counter() - start
+            task.result = (success, log_records, timings, [])
+
+        def failed(task, error):
+            task.data = None
+            task.result = self._failed(task, settings, error)
+
+        success_count = 0
+        total = len(images)
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            threads = [threading.Thread(target=feed, daemon=True)]
+            threads += _stage_threads(read, read_queue, transform_queue,
+                                      self.io_threads, self.workers, failed)
+            threads += _stage_threads(transform, transform_queue, write_queue,
+                                      self.workers, self.io_threads, failed)
+            threads += _stage_threads(write, write_queue, done_queue,
+                                      self.io_threads, 1, failed)
+            for thread in threads:
+                thread.start()
+
+            buffer = {}  # 等待按顺序提交的图片
+            written = []  # 取消后输出已写入、待排空后提交的图片
+            next_index = 0
+            finished = False
+
+            def drop(task):
+                if task.write_s is not None:
+                    written.append(task)
+                window.release()
+
+            try:
+                while True:
+                    # 取消后不再按顺序提交，继续排空流水线直到各级线程退出
+                    if self.cancelled.is_set():
+                        stop.set()
+                    if stop.is_set():
+                        for task in buffer.values():
+                            drop(task)
+                        buffer.clear()
+                    try:
+                        task = done_queue.get(timeout=self.POLL_INTERVAL)
+                    except queue.Empty:
+                        continue
+                    if task is None:
+                        break
+                    if stop.is_set():
+                        drop(task)
+                        continue
+                    buffer[task.index] = task
+
+                    while next_index in buffer and not self.cancelled.is_set():
+                        task = buffer.pop(next_index)
+                        next_index += 1
+                        if self._commit(task, settings, manifest, reused):
+                            success_count += 1
+                        window.release()
+                        if progress_callback and progress_callback(next_index, total) is False:
+                            stop.set()
+                            break
+
+                for task in sorted(written, key=lambda task: task.index):
+                    if self._commit(task, settings, manifest, reused):
+                        success_count += 1
+                finished = True
+            finally:
+                # 提交出错时也要排空流水线，让各级线程退出
+                if not finished:
+                    stop.set()
+                    for _ in buffer:
+                        window.release()
+                    while done_queue.get() is not None:
+                        window.release()
+                for thread in threads:
+                    thread.join()
+                executor.shutdown(cancel_futures=True)
+                self._end_batch(manifest)
+
+        return success_count
+
+    def _commit(self, task, settings, manifest, reused):
+        """按输入顺序提交一张图片的结果，返回是否成功"""
+        i, path, rotation = task.index, task.path, task.rotation
+        if task.reused:
+            self._reuse_output(settings, i, path, rotation, reused[i])
+            return True
+
+        success, log_records, timings, outputs = task.result
+        for record in timings:
+            record['stages']['read'] = task.read_s
+            if task.write_s is not None:
+                record['stages']['write'] = task.write_s
+        self._collect(log_records, timings, outputs)
+        self._record_output(manifest, settings, i, path, rotation, success)
+        return success
+
+    @staticmethod
+    def _failed(task, settings, error):
+        """读取、变换或写入出错时的结果"""
+        print(f"Error processing {task.path}: {error}")
+        number = settings['start_number'] + task.index
+        return False, [skipped_record(number, task.path, str(error))], [], []
+
+
+def _stage_threads(func, inbox, outbox, count, downstream, on_error):
+    """创建一级流水线的工作线程
+
+    每个线程从 inbox 取出图片，调用 func 处理后放入 outbox；func 抛出异常时
+    调用 on_error(task, error)。收到 None 时线程退出，最后一个退出的线程向 outbox
+    放入 downstream 个 None，依次结束下游各级。
+    """
+    remaining = [count]
+    lock = threading.Lock()
+
+    def run():
+        while True:
+            task = inbox.get()
+            if task is None:
+                break
+            try:
+                func(task)
+            except Exception as e:
+                on_error(task, e)
+            outbox.put(task)
+        with lock:
+            remaining[0] -= 1
+            last = remaining[0] == 0
+        if last:
+            for _ in range(downstream):
+                outbox.put(None)
+
+    return [threading.Thread(target=run, daemon=True) for _ in range(count)]
+
+
+def create_processor(settings):
+    """根据设置创建批量处理器"""
+    if settings.get('streaming', False):
+        return StreamingBatchProcessor(settings['workers'], settings.get('io_threads', 4),
+                                       settings.get('profile', False))
+    return ParallelBatchProcessor(settings['workers'], settings.get('profile', False))
+
+
+def _open_image(input_path, data=None):
+    """打开图片文件或已读入的文件内容，错误信息中都使用文件路径"""
+    if data is None:
+        return Image.open(input_path)
+    try:
+        return Image.open(io.BytesIO(data))
+    except UnidentifiedImageError:
+        raise UnidentifiedImageError(f"cannot identify image file {input_path!r}") from None
+
+
+def make_output_filename(prefix, number, padding, output_format):
+    """生成输出文件名"""
+    return f"{prefix}{str(number).zfill(padding)}.{output_format}"
+
+
+def _output_name(settings, i):
+    """第 i 个任务的输出文件名"""
+    return make_output_filename(settings['prefix'], settings['start_number'] + i,
+                                settings['padding'], settings['output_format'])
+
+
+def _task_args(settings, i, path, rotation):
+    """生成 process_image 的参数"""
+    return (path, settings['output_folder'], settings['prefix'],
+            settings['start_number'] + i, settings['padding'],
+            ResizeStage.from_settings(settings), rotation,
+            settings['output_format'], settings['quality'],
+            settings.get('encoder_profile', 'balanced'), settings.get('lossless', False))
+
+
+_worker_processor = None
+
+
+def _process_task(args, instrument=False, capture=False, data=None):
+    """子进程中处理单张图片，返回结果及该图片产生的日志和耗时记录
+
+    capture 为 True 时不直接写入输出，而是把编码结果返回给主进程写入。
+    data 为主进程已读入的源文件内容。
+    """
+    global _worker_processor
+    if _worker_processor is None:
+        _worker_processor = BatchProcessor()
+    processor = _worker_processor
+    processor.instrument = instrument
+    processor.sink = MemorySink() if capture else None
+
+    success = processor.process_image(*args, data=data)
+    log_records = list(processor.log_records)
+    timings = list(processor.timings)
+    outputs = processor.sink.take() if capture else []
+    processor.log_records.clear()
+    processor.timings.clear()
+    return success, log_records, timings, outputs
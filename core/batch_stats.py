@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from array import array
+from collections import deque
+from contextlib import contextmanager, nullcontext
+from core.work_shard import tagged
+import json
+import os
+import time
+
+
+class ImageTiming:
+    """单张图片各阶段的耗时（秒）和输入/输出字节数"""
+
+    def __init__(self, input_path):
+        self.input_path = input_path
+        self.stages = {}
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    @contextmanager
+    def stage(self, name):
+        """计时一个阶段，同名阶段累加"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0.0) + time.perf_counter() - start
+
+    def count_input(self, path, size=None):
+        """记录输入字节数，size 为 None 时取文件大小"""
+        self.bytes_in = os.path.getsize(path) if size is None else size
+
+    def count_output(self, size):
+        self.bytes_out = size
+
+    def to_record(self):
+        """转换为可跨进程传递的字典"""
+        return {
+            'input': self.input_path,
+            'bytes_in': self.bytes_in,
+            'bytes_out': self.bytes_out,
+            'stages': self.stages
+        }
+
+
+class _NullTiming:
+    """未启用统计时使用，不做任何记录"""
+
+    def stage(self, name):
+        return nullcontext()
+
+    def count_input(self, path, size=None):
+        pass
+
+    def count_output(self, size):
+        pass
+
+
+NULL_TIMING = _NullTiming()
+
+
+class BatchStats:
+    """批量处理耗时统计
+
+    逐张累加 ImageTiming 记录，各阶段耗时保存在紧凑数组中，
+    汇总为 p50/p95/最大值、吞吐量（张/秒、MB/秒）等。
+    """
+
+    FILENAME = "processing_stats.json"
+
+    def __init__(self):
+        self.stages = {}  # 阶段名 -> array('d')
+        self.totals = array('d')
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.reused = 0
+        self.started = time.perf_counter()
+        self.finished = None
+
+    @property
+    def count(self):
+        return len(self.totals)
+
+    def add(self, record):
+        """加入一张图片的记录"""
+        for name, seconds in record['stages'].items():
+            self.stages.setdefault(name, array('d')).append(seconds)
+        self.totals.append(sum(record['stages'].values()))
+        self.bytes_in += record['bytes_in']
+        self.bytes_out += record['bytes_out']
+
+    def finish(self):
+        """记录批量处理结束时间"""
+        self.finished = time.perf_counter()
+
+    def summary(self):
+        """汇总统计"""
+        wall = (self.finished or time.perf_counter()) - self.started
+        busy = sum(self.totals)
+        stages = {}
+        for name, values in self.stages.items():
+            stages[name] = dict(_distribution(values),
+                                share=round(sum(values) / busy, 4) if busy else 0.0)
+
+        return {
+            'images': self.count,
+            'reused': self.reused,
+            'wall_s': round(wall, 3),
+            'images_per_s': round(self.count / wall, 3) if wall else None,
+            'bytes_in': self.bytes_in,
+            'bytes_out': self.bytes_out,
+            'mb_in_per_s': round(self.bytes_in / wall / 1e6, 3) if wall else None,
+            'mb_out_per_s': round(self.bytes_out / wall / 1e6, 3) if wall else None,
+            'per_image': _distribution(self.totals),
+            'stages': stages
+        }
+
+    def save(self, output_folder, tag=''):
+        """写入 JSON 统计文件（文件名带分片标记 tag），返回汇总"""
+        summary = self.summary()
+        path = os.path.join(output_folder, tagged(self.FILENAME, tag))
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, indent=2, ensure_ascii=False)
+        return summary
+
+    @staticmethod
+    def format_summary(summary):
+        """生成便于阅读的汇总文本（每行一条）"""
+        lines = [f"批量处理 {summary['images']} 张（复用 {summary['reused']} 张），"
+                 f"耗时 {summary['wall_s']:.1f} 秒，{summary['images_per_s'] or 0:.2f} 张/秒，"
+                 f"读取 {summary['mb_in_per_s'] or 0:.2f} MB/秒，"
+                 f"写入 {summary['mb_out_per_s'] or 0:.2f} MB/秒"]
+        ranked = sorted(summary['stages'].items(), key=lambda item: -item[1]['total_s'])
+        for name, stage in ranked:
+            lines.append(f"  {name}: {stage['share'] * 100:.1f}%，"
+                         f"p50 {stage['p50_ms']:.1f} ms，p95 {stage['p95_ms']:.1f} ms，"
+                         f"最大 {stage['max_ms']:.1f} ms")
+        return lines
+
+
+class ThroughputMeter:
+    """批量处理进度的实时吞吐量和剩余时间
+
+    按最近 WINDOW 秒内的进度计算张/秒和 MB/秒，吞吐量变化时估计能较快跟上；
+    暂停期间不计时。
+    """
+
+    WINDOW = 10.0
+
+    def __init__(self, total):
+        self.total = total
+        self.done = 0
+        self.bytes_done = 0
+        self.samples = deque([(time.monotonic(), 0, 0)])  # (时间, 张数, 字节数)
+
+    def update(self, done, bytes_done):
+        """记录当前已完成的张数和输入字节数"""
+        now = time.monotonic()
+        self.done = done
+        self.bytes_done = bytes_done
+        self.samples.append((now, done, bytes_done))
+        while len(self.samples) > 2 and now - self.samples[1][0] >= self.WINDOW:
+            self.samples.popleft()
+
+    def resume(self):
+        """暂停结束后重新开始计时"""
+        self.samples = deque([(time.monotonic(), self.done, self.bytes_done)])
+
+    def rates(self):
+        """返回 (张/秒, MB/秒, 剩余秒数)，数据不足时为 None"""
+        start, start_done, start_bytes = self.samples[0]
+        elapsed = time.monotonic() - start
+        if elapsed <= 0 or self.done == start_done:
+            return None, None, None
+        images_per_s = (self.done - start_done) / elapsed
+        mb_per_s = (self.bytes_done - start_bytes) / elapsed / 1e6
+        return images_per_s, mb_per_s, (self.total - self.done) / images_per_s
+
+    def describe(self):
+        """进度文本，如：120/1000 张，35.2 张/秒，12.4 MB/秒，剩余 0:25"""
+        images_per_s, mb_per_s, eta = self.rates()
+        text = f"{self.done}/{self.total} 张"
+        if images_per_s is not None:
+            text += (f"，{images_per_s:.1f} 张/秒，{mb_per_s:.1f} MB/秒，"
+                     f"剩余 {format_duration(eta)}")
+        return text
+
+
+def format_duration(seconds):
+    """格式化为 m:ss 或 h:mm:ss"""
+    minutes, seconds = divmod(int(round(seconds)), 60)
+    hours, minutes = divmod(minutes, 60)
+    if hours:
+        return f"{hours}:{minutes:02d}:{seconds:02d}"
+    return f"{minutes}:{seconds:02d}"
+
+
+def percentile(ordered, p):
+    """最近秩百分位数（ordered 已排序且非空）"""
+    index = min(len(ordered) - 1, max(0, int(p / 100 * len(ordered) + 0.5) - 1))
+    return ordered[index]
+
+
+def _distribution(values):
+    """计数、总和及 p50/p95/最大值（毫秒）"""
+    if not values:
+        return {'count': 0, 'total_s': 0.0, 'p50_ms': 0.0, 'p95_ms': 0.0, 'max_ms': 0.0}
+    ordered = sorted(values)
+    return {
+        'count': len(ordered),
+        'total_s': round(sum(ordered), 6),
+        'p50_ms': round(percentile(ordered, 50) * 1000, 3),
+        'p95_ms': round(percentile(ordered, 95) * 1000, 3),
+        'max_ms': round(ordered[-1] * 1000, 3)
+    }
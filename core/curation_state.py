@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from array import array
+from utils.config import Config
+import hashlib
+import mmap
+import os
+import struct
+
+
+class PathTable:
+    """紧凑路径表
+
+    目录只保存一次，文件名以 UTF-8 连续存放在一个字节串中，
+    按索引访问时再拼接为完整路径。构建后不可修改。
+    """
+
+    def __init__(self, paths=()):
+        self.dirs = []
+        self.dir_ids = array('I')
+        self.names = bytearray()
+        self.offsets = array('Q', [0])
+
+        lookup = {}
+        for path in paths:
+            directory, name = os.path.split(path)
+            dir_id = lookup.get(directory)
+            if dir_id is None:
+                dir_id = lookup[directory] = len(self.dirs)
+                self.dirs.append(directory)
+            self.dir_ids.append(dir_id)
+            self.names += name.encode('utf-8', 'surrogateescape')
+            self.offsets.append(len(self.names))
+
+    def __len__(self):
+        return len(self.dir_ids)
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        name = self.names[self.offsets[index]:self.offsets[index + 1]]
+        return os.path.join(self.dirs[self.dir_ids[index]],
+                            name.decode('utf-8', 'surrogateescape'))
+
+    def __iter__(self):
+        # 目录前缀只拼接一次，逐个访问时比按索引取值快数倍
+        prefixes = [os.path.join(directory, '') for directory in self.dirs]
+        names, offsets, dir_ids = self.names, self.offsets, self.dir_ids
+        for i in range(len(dir_ids)):
+            name = names[offsets[i]:offsets[i + 1]].decode('utf-8', 'surrogateescape')
+            yield prefixes[dir_ids[i]] + name
+
+    def __eq__(self, other):
+        if not isinstance(other, PathTable):
+            return NotImplemented
+        return (self.dir_ids == other.dir_ids and self.offsets == other.offsets
+                and self.names == other.names and self.dirs == other.dirs)
+
+
+class CurationState:
+    """图片整理状态（列式存储）
+
+    路径保存在 PathTable 中，保留标记和旋转角度（以 90° 为单位）各占一个字节，
+    并维护保留数量等计数，无需遍历即可更新统计。
+
+    会话文件为二进制格式：
+        文件头 | 根目录 | 目录表 | 目录编号 | 文件名偏移 | 文件名 | 保留标记 | 旋转
+    保存后以读写方式映射到内存，之后每次修改只写入对应的一个字节，
+    程序中断也不会丢失已做的决定。
+    """
+
+    MAGIC = b'DIPSTATE'
+    VERSION = 1
+    # magic, version, count, root 长度, 目录表长度, 文件名长度
+    HEADER = struct.Struct('<8sIQQQQ')
+
+    def __init__(self, root='', paths=()):
+        self.root = root
+        self.paths = paths if isinstance(paths, PathTable) else PathTable(paths)
+        count = len(self.paths)
+        self.keep = bytearray(b'\x01') * count
+        self.rotation = bytearray(count)
+        self.keep_count = count
+        self.rotated_count = 0
+
+        self._file = None
+        self._mmap = None
+        self._keep_offset = 0
+        self._rotation_offset = 0
+
+    def __len__(self):
+        return len(self.paths)
+
+    def path(self, index):
+        return self.paths[index]
+
+    def is_kept(self, index):
+        return bool(self.keep[index])
+
+    def get_rotation(self, index):
+        """顺时针旋转角度"""
+        return self.rotation[index] * 90
+
+    def set_keep(self, index, keep):
+        """设置保留标记"""
+        value = 1 if keep else 0
+        if self.keep[index] == value:
+            return
+        self.keep[index] = value
+        self.keep_count += 1 if value else -1
+        if self._mmap is not None:
+            self._mmap[self._keep_offset + index] = value
+
+    def set_rotation(self, index, rotation):
+        """设置顺时针旋转角度（90° 的倍数）"""
+        value = (rotation // 90) % 4
+        old = self.rotation[index]
+        if old == value:
+            return
+        self.rotation[index] = value
+        self.rotated_count += (1 if value else 0) - (1 if old else 0)
+        if self._mmap is not None:
+            self._mmap[self._rotation_offset + index] = value
+
+    def kept(self):
+        """按顺序返回保留的图片 [(path, rotation), ...]"""
+        return [(self.paths[i], self.rotation[i] * 90)
+                for i in range(len(self)) if self.keep[i]]
+
+    @staticmethod
+    def session_path(root):
+        """输入文件夹对应的会话文件路径"""
+        digest = hashlib.sha1(os.path.abspath(root).encode('utf-8', 'surrogateescape'))
+        return os.path.join(Config.cache_dir("sessions"), f"{digest.hexdigest()}.session")
+
+    @classmethod
+    def open_session(cls, root, paths):
+        """打开输入文件夹的整理会话
+
+        恢复上次会话中仍存在的图片的保留/旋转决定，新图片使用默认值。
+        返回的状态已关联会话文件，之后的修改会直接写入。
+        """
+        state = cls(root, paths)
+        if not len(state):
+            return state
+        path = cls.session_path(root)
+        previous = cls.load(path)
+
+        if previous is not None and previous.paths == state.paths:
+            return previous
+
+        if previous is not None:
+            rows = {p: i for i, p in enumerate(previous.paths)}
+            for i, p in enumerate(state.paths):
+                j = rows.get(p)
+                if j is not None:
+                    state.keep[i] = previous.keep[j]
+                    state.rotation[i] = previous.rotation[j]
+            previous.close()
+            state._recount()
+
+        state.save(path)
+        return state
+
+    def save(self, path):
+        """保存会话文件（原子替换），并关联该文件"""
+        self.close()
+        root = self.root.encode('utf-8', 'surrogateescape')
+        dirs = "\0".join(self.paths.dirs).encode('utf-8', 'surrogateescape')
+
+        temp_path = path + ".tmp"
+        with open(temp_path, 'wb') as f:
+            f.write(self.HEADER.pack(self.MAGIC, self.VERSION, len(self), len(root),
+                                     len(dirs), len(self.paths.names)))
+            f.write(root)
+            f.write(dirs)
+            f.write(self.paths.dir_ids.tobytes())
+            f.write(self.paths.offsets.tobytes())
+            f.write(self.paths.names)
+            f.write(self.keep)
+            f.write(self.rotation)
+        os.replace(temp_path, path)
+        self._attach(path)
+
+    @classmethod
+    def load(cls, path, readonly=False):
+        """加载会话文件，不存在或格式不符时返回 None
+
+        readonly 为 True 时只读打开，读取后即关闭文件（没有写权限时也能读取），
+        之后的修改不会写回。
+        """
+        try:
+            state = cls()
+            state._attach(path, readonly)
+            state._read()
+        except (OSError, ValueError, struct.error):
+            state.close()
+            return None
+        if readonly:
+            state.close()
+        return state
+
+    def close(self):
+        """写回并关闭会话文件"""
+        if self._mmap is not None:
+            self._mmap.flush()
+            self._mmap.close()
+            self._mmap = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _attach(self, path, readonly=False):
+        """映射会话文件（默认读写），并计算保留标记和旋转的位置"""
+        self._file = open(path, 'rb' if readonly else 'r+b')
+        self._mmap = mmap.mmap(self._file.fileno(), 0,
+                               access=mmap.ACCESS_READ if readonly else mmap.ACCESS_WRITE)
+        magic, version, count, root_len, dirs_len, names_len = \
+            self.HEADER.unpack_from(self._mmap, 0)
+        if magic != self.MAGIC or version != self.VERSION:
+            raise ValueError(f"不支持的会话文件: {path}")
+
+        self._keep_offset = (self.HEADER.size + root_len + dirs_len
+                             + count * 4 + (count + 1) * 8 + names_len)
+        self._rotation_offset = self._keep_offset + count
+        if self._rotation_offset + count != len(self._mmap):
+            raise ValueError(f"会话文件已损坏: {path}")
+
+    def _read(self):
+        """从已映射的会话文件读取全部内容"""
+        data = self._mmap
+        _, _, count, root_len, dirs_len, names_len = self.HEADER.unpack_from(data, 0)
+        pos = self.HEADER.size
+
+        def take(size):
+            nonlocal pos
+            chunk = data[pos:pos + size]
+            pos += size
+            return chunk
+
+        self.root = take(root_len).decode('utf-8', 'surrogateescape')
+        dirs = take(dirs_len).decode('utf-8', 'surrogateescape')
+
+        paths = PathTable()
+        paths.dirs = dirs.split("\0") if count else []
+        paths.dir_ids = array('I')
+        paths.dir_ids.frombytes(take(count * 4))
+        paths.offsets = array('Q')
+        paths.offsets.frombytes(take((count + 1) * 8))
+        paths.names = bytearray(take(names_len))
+        self.paths = paths
+
+        self.keep = bytearray(take(count))
+        self.rotation = bytearray(take(count))
+        self._recount()
+
+    def _recount(self):
+        self.keep_count = self.keep.count(1)
+        self.rotated_count = len(self.rotation) - self.rotation.count(0)
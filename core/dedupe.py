@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
+import os
+
+try:
+    import numpy as np
+except ImportError:  # numpy 为可选依赖，仅查找重复图片时需要
+    np = None
+
+
+class DuplicateFinder:
+    """基于感知哈希（dHash）查找近似重复的图片
+
+    哈希由 ImageLoader 的缩略图计算（优先读取持久化缓存），按批次用 NumPy 向量化。
+    查找时把 64 位哈希分成 threshold + 1 段：汉明距离不超过 threshold 的两个哈希
+    至少有一段完全相同，因此只需比较同一分段桶中的哈希，避免两两比较。
+    完全相同的哈希先合并，分桶只比较不同的哈希；相似的图片用 NumPy 实现的并查集合并为组。
+    """
+
+    HASH_SIZE = 8
+    BATCH_SIZE = 2048
+    UNION_BATCH = 65536  # 累计找到的相似对达到此数量时合并一次
+
+    def __init__(self, image_loader, threshold=3, workers=None):
+        if np is None:
+            raise ImportError("查找重复图片需要安装 numpy")
+        self.image_loader = image_loader
+        self.threshold = threshold
+        self.workers = workers or min(8, os.cpu_count() or 1)
+
+    def compute_hashes(self, paths, progress_callback=None):
+        """计算 dHash，返回 (uint64 哈希数组, 是否有效的布尔数组)
+
+        progress_callback(done, total) 返回 False 时取消，返回 None。
+        """
+        total = len(paths)
+        hashes = np.zeros(total, dtype=np.uint64)
+        valid = np.zeros(total, dtype=bool)
+        width, height = self.HASH_SIZE + 1, self.HASH_SIZE
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            for start in range(0, total, self.BATCH_SIZE):
+                batch = [paths[i] for i in range(start, min(start + self.BATCH_SIZE, total))]
+                pixels = np.zeros((len(batch), height, width), dtype=np.uint8)
+                for offset, data in enumerate(executor.map(self._hash_pixels, batch)):
+                    if data is not None:
+                        pixels[offset] = np.frombuffer(data, dtype=np.uint8).reshape(height, width)
+                        valid[start + offset] = True
+
+                # 每行相邻像素比较得到 64 位
+                bits = pixels[:, :, 1:] > pixels[:, :, :-1]
+                packed = np.packbits(bits.reshape(len(batch), -1), axis=1)
+                hashes[start:start + len(batch)] = packed.view('>u8').ravel()
+
+                done = start + len(batch)
+                if progress_callback and progress_callback(done, total) is False:
+                    return None
+        return hashes, valid
+
+    def _hash_pixels(self, path):
+        """工作线程：缩略图缩小为 (HASH_SIZE + 1) x HASH_SIZE 的灰度像素"""
+        try:
+            image = self.image_loader.get_thumbnail_image(path)
+        except Exception:
+            return None
+        image = image.convert('L').resize((self.HASH_SIZE + 1, self.HASH_SIZE),
+                                          Image.Resampling.BOX)
+        return image.tobytes()
+
+    def find_groups(self, hashes, valid=None):
+        """返回重复组列表，每组为按索引排序的列表（至少两张），按组内第一张排序"""
+        indices = np.arange(len(hashes)) if valid is None else np.flatnonzero(valid)
+        # 完全相同的哈希直接归为一组，只比较不同的哈希
+        unique, inverse = np.unique(hashes[indices], return_inverse=True)
+        labels = np.arange(len(unique))
+        self._connect_similar(unique, labels)
+
+        components = labels[inverse.ravel()]
+        order = np.lexsort((indices, components))
+        components, members = components[order], indices[order]
+        starts = np.flatnonzero(np.r_[True, components[1:] != components[:-1]])
+        sizes = np.diff(np.r_[starts, len(members)])
+        groups = [members[start:start + size].tolist()
+                  for start, size in zip(starts[sizes > 1].tolist(), sizes[sizes > 1].tolist())]
+        groups.sort(key=lambda group: group[0])
+        return groups
+
+    def _connect_similar(self, values, labels):
+        """逐段分桶，把汉明距离不超过 threshold 的哈希合并到同一分量（labels）
+
+        桶内按排序后的位置差 k = 1, 2, ... 批量比较，每轮只处理桶内仍有第 k 个之后元素的位置；
+        已在同一分量中的对（包括之前分段中找到的）在计算距离前跳过。
+        """
+        count = len(values)
+        bounds = np.linspace(0, 64, self.threshold + 2).astype(int)
+
+        for low, high in zip(bounds[:-1], bounds[1:]):
+            mask = np.uint64((1 << int(high - low)) - 1)
+            bands = (values >> np.uint64(low)) & mask
+            order = np.argsort(bands, kind='stable')
+            sorted_bands = bands[order]
+            # 排序后每个位置所在的相同分段值区间的结束位置
+            starts = np.flatnonzero(np.r_[True, sorted_bands[1:] != sorted_bands[:-1]])
+            sizes = np.diff(np.r_[starts, count])
+            ends = np.repeat(starts + sizes, sizes)
+
+            found_a, found_b, found = [], [], 0
+            active = np.flatnonzero(ends - np.arange(count) > 1)
+            step = 1
+            while len(active):
+                a, b = order[active], order[active + step]
+                unconnected = labels[a] != labels[b]
+                a, b = a[unconnected], b[unconnected]
+                close = _popcount(values[a] ^ values[b]) <= self.threshold
+                found_a.append(a[close])
+                found_b.append(b[close])
+                found += int(close.sum())
+                if found >= self.UNION_BATCH:
+                    _union(labels, np.concatenate(found_a), np.concatenate(found_b))
+                    found_a, found_b, found = [], [], 0
+
+                step += 1
+                active = active[ends[active] - active > step]
+            if found:
+                _union(labels, np.concatenate(found_a), np.concatenate(found_b))
+
+
+def _union(labels, a, b):
+    """合并 a[i] 与 b[i] 所在的分量
+
+    labels 中每个元素直接指向所在分量的根（根为分量中最小的编号），合并后保持这一性质。
+    """
+    while len(a):
+        root_a, root_b = labels[a], labels[b]
+        differ = root_a != root_b
+        if not differ.any():
+            return
+        low = np.minimum(root_a[differ], root_b[differ])
+        high = np.maximum(root_a[differ], root_b[differ])
+        np.minimum.at(labels, high, low)
+        # 路径压缩：所有元素直接指向根
+        while True:
+            parents = labels[labels]
+            if np.array_equal(parents, labels):
+                break
+            labels[:] = parents
+        a, b = low, high
+
+
+def _popcount(values):
+    """uint64 数组逐元素统计 1 的位数"""
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(values)
+    as_bytes = values.view(np.uint8).reshape(values.shape + (8,))
+    return _POPCOUNT_TABLE[as_bytes].sum(axis=-1, dtype=np.uint8)
+
+
+_POPCOUNT_TABLE = (np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+                   if np is not None else None)
+
+
+def find_duplicates(image_loader, paths, threshold=3, progress_callback=None):
+    """查找重复组，取消时返回 None"""
+    finder = DuplicateFinder(image_loader, threshold)
+    result = finder.compute_hashes(paths, progress_callback)
+    if result is None:
+        return None
+    return finder.find_groups(*result)
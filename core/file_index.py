@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from utils.config import Config
+import hashlib
+import json
+import os
+
+
+class FileIndex:
+    """持久化文件索引
+
+    按目录记录 目录修改时间、图片文件 {文件名: [大小, 修改时间]} 和子目录列表。
+    重新扫描时，修改时间未变的目录直接复用记录，只需 stat 目录本身；
+    变化的目录重新列出，并统计新增和删除的文件。
+    索引按绝对路径记录目录；返回的路径以调用方传入的 root 为前缀（与 os.walk 一致），
+    传入相对路径时结果也是相对路径。
+    """
+
+    VERSION = 1
+
+    def __init__(self, root, extensions, index_path=None):
+        self.root = os.path.abspath(root)
+        self.base = root
+        self.extensions = tuple(extensions)
+        if index_path is None:
+            digest = hashlib.sha1(self.root.encode('utf-8')).hexdigest()
+            index_path = os.path.join(Config.cache_dir("file_index"), f"{digest}.json")
+        self.index_path = index_path
+        self.dirs = {}  # 目录 -> {'mtime': ..., 'files': {...}, 'dirs': [...]}
+        self.added = []
+        self.removed = []
+        self.load()
+
+    def load(self):
+        """加载索引"""
+        if not os.path.exists(self.index_path):
+            return
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if (data.get('version') == self.VERSION and data.get('root') == self.root
+                    and tuple(data.get('extensions', ())) == self.extensions):
+                self.dirs = data['dirs']
+        except Exception as e:
+            print(f"Error loading file index: {e}")
+
+    def save(self):
+        """保存索引"""
+        tmp_path = self.index_path + ".tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'version': self.VERSION, 'root': self.root,
+                           'extensions': list(self.extensions), 'dirs': self.dirs},
+                          f, ensure_ascii=False)
+            os.replace(tmp_path, self.index_path)
+        except Exception as e:
+            print(f"Error saving file index: {e}")
+
+    def scan(self, batch_size=1000):
+        """扫描并分批返回图片路径
+
+        每批为一个路径列表；扫描结束后 added / removed 为相对上次索引新增和删除的文件，
+        首次扫描时全部记为新增。
+        """
+        old_dirs = self.dirs
+        new_dirs = {}
+        self.added = []
+        self.removed = []
+
+        batch = []
+        stack = [self.root]
+        while stack:
+            folder = stack.pop()
+            try:
+                mtime = os.stat(folder).st_mtime_ns
+            except OSError:
+                continue
+
+            shown = self._shown(folder)
+            old = old_dirs.get(folder)
+            if old is not None and old['mtime'] == mtime:
+                entry = old
+            else:
+                entry = self._list_dir(folder, mtime)
+                old_files = old['files'] if old is not None else {}
+                self.added.extend(os.path.join(shown, name)
+                                  for name in entry['files'] if name not in old_files)
+                self.removed.extend(os.path.join(shown, name)
+                                    for name in old_files if name not in entry['files'])
+            new_dirs[folder] = entry
+
+            for name in entry['files']:
+                batch.append(os.path.join(shown, name))
+                if len(batch) >= batch_size:
+                    yield batch
+                    batch = []
+
+            stack.extend(os.path.join(folder, name) for name in reversed(entry['dirs']))
+
+        # 已不存在的目录中的文件全部记为删除
+        for folder, entry in old_dirs.items():
+            if folder not in new_dirs:
+                shown = self._shown(folder)
+                self.removed.extend(os.path.join(shown, name) for name in entry['files'])
+
+        self.dirs = new_dirs
+        if batch:
+            yield batch
+
+    def _shown(self, folder):
+        """索引中的目录（绝对路径）对应的、以调用方传入的 root 为前缀的路径"""
+        relative = folder[len(self.root):].lstrip(os.sep)
+        return os.path.join(self.base, relative) if relative else self.base
+
+    def _list_dir(self, folder, mtime):
+        """列出目录中的图片文件和子目录"""
+        files = {}
+        dirs = []
+        try:
+            with os.scandir(folder) as it:
+                for item in it:
+                    try:
+                        if item.is_dir(follow_symlinks=False):
+                            dirs.append(item.name)
+                        elif (item.name.lower().endswith(self.extensions)
+                              and item.is_file()):
+                            st = item.stat()
+                            files[item.name] = [st.st_size, st.st_mtime_ns]
+                    except OSError:
+                        continue
+        except OSError as e:
+            print(f"Error scanning folder {folder}: {e}")
+
+        dirs.sort()
+        return {'mtime': mtime, 'files': dict(sorted(files.items())), 'dirs': dirs}
@@ -2,29 +2,53 @@
 # -*- coding: utf-8 -*-
 
 from PIL import Image
-from PyQt5.QtGui import QPixmap, QImage
+from core.file_index import FileIndex
+from core.thumbnail_store import ThumbnailStore
+from utils.config import Config
+from utils.lru_cache import LRUCache
+import io
 import os
+import struct
 
 
 class ImageLoader:
     """图片加载器"""
 
-    SUPPORTED_FORMATS = ('.jpg', '.jpeg', '.png', '. bmp', '.tiff', '.webp')
+    SUPPORTED_FORMATS = ('.jpg', '.jpeg', '.png', '.bmp', '.tif', '.tiff', '.webp')
     THUMBNAIL_SIZE = (160, 160)
-
-    def __init__(self):
-        self.thumbnail_cache = {}
+    THUMBNAIL_CACHE_BYTES = 256 * 1024 * 1024
+    PREVIEW_SIZE = (2048, 2048)
+
+    def __init__(self, thumbnail_store=None, cache_bytes=THUMBNAIL_CACHE_BYTES):
+        self.thumbnail_cache = LRUCache(cache_bytes, self.pixmap_bytes)
+        self._thumbnail_store = thumbnail_store
+        self.last_scan = None  # 最近一次扫描的 FileIndex（含新增/删除的文件）
+
+    @property
+    def thumbnail_store(self):
+        """持久化缩略图存储（首次使用时打开）"""
+        if self._thumbnail_store is None:
+            self._thumbnail_store = ThumbnailStore(Config.cache_dir("thumbnails"),
+                                                   self.THUMBNAIL_SIZE)
+        return self._thumbnail_store
 
     def scan_folder(self, folder):
         """扫描文件夹，返回所有图片路径"""
         image_files = []
+        for batch in self.iter_scan(folder):
+            image_files.extend(batch)
+        return sorted(image_files)
 
-        for root, dirs, files in os.walk(folder):
-            for file in files:
-                if file.lower().endswith(self.SUPPORTED_FORMATS):
-                    image_files.append(os.path.join(root, file))
+    def iter_scan(self, folder, batch_size=1000):
+        """流式扫描文件夹，分批返回图片路径（未排序）
 
-        return sorted(image_files)
+        使用持久化文件索引，未变化的目录不再重新列出；
+        扫描结束后 last_scan.added / last_scan.removed 为新增和删除的文件。
+        """
+        index = FileIndex(folder, self.SUPPORTED_FORMATS)
+        yield from index.scan(batch_size)
+        index.save()
+        self.last_scan = index
 
     def load_image(self, path):
         """加载图片"""
@@ -37,24 +61,132 @@ class ImageLoader:
             print(f"Error loading image {path}: {e}")
             return None
 
-    def get_thumbnail(self, path):
-        """获取缩略图"""
-        if path in self.thumbnail_cache:
-            return self.thumbnail_cache[path]
+    def load_preview(self, path, max_size=PREVIEW_SIZE):
+        """以降低的分辨率加载预览图，返回 (图片, 原始尺寸)
 
+        返回的图片不小于 max_size（原图更小时除外），显示时再精确缩放。
+        """
         try:
             image = Image.open(path)
-            image.thumbnail(self.THUMBNAIL_SIZE, Image.Resampling.LANCZOS)
+            source_size = image.size
+            target = self.fit_size(source_size, max_size)
+            image = self.open_reduced(image, target)
+            image.load()
+
+            # 非 JPEG 格式无法在解码时缩小，按整数倍快速缩减
+            factor = min(image.width // target[0], image.height // target[1])
+            if factor >= 2:
+                # reduce 不支持 1 位和 16 位灰度图，对调色板索引取平均也没有意义，先转为 RGB
+                if image.mode in ('1', 'P', 'PA') or image.mode.startswith('I;16'):
+                    image = image.convert('RGB')
+                image = image.reduce(factor)
 
-            # 转换为QPixmap
             if image.mode != 'RGB':
                 image = image.convert('RGB')
+            return image, source_size
+        except Exception as e:
+            print(f"Error loading image {path}: {e}")
+            return None, None
+
+    @staticmethod
+    def fit_size(size, box):
+        """等比例缩放到 box 以内后的尺寸（不放大）"""
+        width, height = size
+        scale = min(box[0] / width, box[1] / height, 1)
+        return max(1, round(width * scale)), max(1, round(height * scale))
+
+    @staticmethod
+    def open_reduced(image, size):
+        """请求解码器以不小于 size 的分辨率解码（JPEG 使用 DCT 缩放）"""
+        if image.format == 'JPEG':
+            image.draft('RGB', size)
+        return image
+
+    @staticmethod
+    def exif_thumbnail(image, size):
+        """读取 JPEG 内嵌的 EXIF 缩略图
+
+        仅当内嵌缩略图与原图宽高比一致且分辨率足以生成 size 大小的缩略图时返回，
+        否则返回 None。
+        """
+        exif = image.info.get('exif')
+        if not exif or not exif.startswith(b'Exif\x00\x00'):
+            return None
+
+        try:
+            tiff = exif[6:]
+            order = {b'II': '<', b'MM': '>'}.get(tiff[:2])
+            if order is None:
+                return None
+
+            # IFD0 之后的下一个 IFD 即缩略图所在的 IFD1
+            ifd0 = struct.unpack_from(order + 'I', tiff, 4)[0]
+            count = struct.unpack_from(order + 'H', tiff, ifd0)[0]
+            ifd1 = struct.unpack_from(order + 'I', tiff, ifd0 + 2 + count * 12)[0]
+            if ifd1 == 0:
+                return None
+
+            tags = {}
+            count = struct.unpack_from(order + 'H', tiff, ifd1)[0]
+            for i in range(count):
+                entry = ifd1 + 2 + i * 12
+                tag, field_type = struct.unpack_from(order + 'HH', tiff, entry)
+                value_format = 'H' if field_type == 3 else 'I'
+                tags[tag] = struct.unpack_from(order + value_format, tiff, entry + 8)[0]
+
+            # 0x0201: JPEGInterchangeFormat, 0x0202: JPEGInterchangeFormatLength
+            offset, length = tags.get(0x0201), tags.get(0x0202)
+            if not offset or not length or offset + length > len(tiff):
+                return None
+
+            thumb = Image.open(io.BytesIO(tiff[offset:offset + length]))
+            thumb.load()
+        except (struct.error, OSError, SyntaxError):
+            return None
+
+        width, height = image.size
+        target = ImageLoader.fit_size(image.size, size)
+        if thumb.width < target[0] or thumb.height < target[1]:
+            return None
+        if abs(thumb.width / thumb.height - width / height) > 0.02 * width / height:
+            return None
+        return thumb
+
+    def get_thumbnail_image(self, path):
+        """获取缩略图（PIL RGB 图像），优先读取持久化存储"""
+        image = self.thumbnail_store.get(path)
+        if image is not None:
+            return image
+
+        image = Image.open(path)
+        exif_thumb = self.exif_thumbnail(image, self.THUMBNAIL_SIZE)
+        if exif_thumb is not None:
+            image = exif_thumb
+        else:
+            # 保留 2 倍余量，保证 LANCZOS 缩小的质量
+            self.open_reduced(image, (self.THUMBNAIL_SIZE[0] * 2, self.THUMBNAIL_SIZE[1] * 2))
 
-            img_data = image.tobytes("raw", "RGB")
-            qimage = QImage(img_data, image.width, image.height, QImage.Format_RGB888)
-            pixmap = QPixmap.fromImage(qimage)
+        image.thumbnail(self.THUMBNAIL_SIZE, Image.Resampling.LANCZOS)
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
 
-            self.thumbnail_cache[path] = pixmap
+        self.thumbnail_store.put(path, image)
+        return image
+
+    def get_thumbnail(self, path):
+        """获取缩略图"""
+        # Qt 仅在需要界面时导入，命令行模式不会加载
+        from PyQt5.QtGui import QPixmap
+
+        pixmap = self.thumbnail_cache.get(path)
+        if pixmap is not None:
+            return pixmap
+
+        try:
+            image = self.get_thumbnail_image(path)
+            pixmap = QPixmap.fromImage(self.to_qimage(image))
+
+            self.thumbnail_cache.put(path, pixmap)
             return pixmap
 
         except Exception as e:
@@ -62,6 +194,26 @@ class ImageLoader:
             # 返回默认缩略图
             return QPixmap(160, 160)
 
+    @staticmethod
+    def pixmap_bytes(pixmap):
+        """估算 QPixmap 占用的字节数"""
+        return pixmap.width() * pixmap.height() * max(pixmap.depth(), 8) // 8
+
+    @staticmethod
+    def to_qimage(image):
+        """将 RGB 图像转换为 QImage（复制像素数据）"""
+        from PyQt5.QtGui import QImage
+
+        img_data = image.tobytes("raw", "RGB")
+        qimage = QImage(img_data, image.width, image.height, image.width * 3,
+                        QImage.Format_RGB888)
+        return qimage.copy()
+
+    def flush(self):
+        """将持久化缩略图写入磁盘"""
+        if self._thumbnail_store is not None:
+            self._thumbnail_store.flush()
+
     def clear_cache(self):
         """清空缓存"""
         self.thumbnail_cache.clear()
\ No newline at end of file
@@ -1,38 +1,509 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+from core.batch_stats import NULL_TIMING
 from PIL import Image
+import io
+import math
 import os
+import time
 
 
 class ImageProcessor:
     """图片处理器"""
 
+    # 顺时针旋转角度对应的无损转置
+    TRANSPOSE = {
+        90: Image.Transpose.ROTATE_270,
+        180: Image.Transpose.ROTATE_180,
+        270: Image.Transpose.ROTATE_90
+    }
+
+    # 源文件格式 -> 可直接复制的输出格式
+    COPY_FORMATS = {
+        'PNG': ('png',),
+        'JPEG': ('jpg', 'jpeg'),
+        'WEBP': ('webp',)
+    }
+
+    # 输出格式 -> Pillow 格式名
+    FORMAT_NAMES = {
+        'png': 'PNG',
+        'jpg': 'JPEG',
+        'jpeg': 'JPEG',
+        'webp': 'WEBP'
+    }
+
+    # 编码配置：各格式的编码参数（质量和是否无损由设置单独指定）
+    # JPEG subsampling：0 为 4:4:4（保留全部色度），2 为 4:2:0（色度减半，编码更快、文件更小）
+    ENCODER_PROFILES = {
+        'fastest': {
+            'PNG': {'compress_level': 1},
+            'JPEG': {'subsampling': 2, 'optimize': False, 'progressive': False},
+            'WEBP': {'method': 0}
+        },
+        'balanced': {
+            'PNG': {'compress_level': 3},
+            'JPEG': {'subsampling': 0, 'optimize': True, 'progressive': False},
+            'WEBP': {'method': 4}
+        },
+        'smallest': {
+            'PNG': {'compress_level': 9, 'optimize': True},
+            'JPEG': {'subsampling': 2, 'optimize': True, 'progressive': True},
+            'WEBP': {'method': 6}
+        }
+    }
+
+    # 重采样配置：滤波器；reducing_gap 为先整数倍 reduce 再精确重采样的余量
+    # （None 表示直接从原图重采样）；draft_margin 为 JPEG 降低分辨率解码时
+    # 相对目标尺寸保留的倍数（None 表示完整解码）
+    RESAMPLING = {
+        'fast': {'resample': Image.Resampling.BILINEAR, 'reducing_gap': 2.0, 'draft_margin': 1},
+        'balanced': {'resample': Image.Resampling.LANCZOS, 'reducing_gap': 3.0,
+                     'draft_margin': 2},
+        'best': {'resample': Image.Resampling.LANCZOS, 'reducing_gap': None,
+                 'draft_margin': None}
+    }
+
     @staticmethod
-    def resize_image(image, scale_percent):
-        """等比例缩放图片"""
-        width, height = image.size
-        new_width = int(width * scale_percent / 100)
-        new_height = int(height * scale_percent / 100)
+    def resize_image(image, scale_percent=100, profile='best', size=None):
+        """缩放图片到 size，未指定时按 scale_percent 等比例缩放"""
+        if size is None:
+            width, height = image.size
+            size = (int(width * scale_percent / 100), int(height * scale_percent / 100))
 
-        return image.resize((new_width, new_height), Image.Resampling.LANCZOS)
+        config = ImageProcessor.RESAMPLING[profile]
+        return image.resize(size, config['resample'], reducing_gap=config['reducing_gap'])
 
     @staticmethod
     def rotate_image(image, angle):
-        """旋转图片"""
+        """旋转图片（顺时针，90° 的倍数使用无损转置）"""
+        angle %= 360
         if angle == 0:
             return image
+        if angle in ImageProcessor.TRANSPOSE:
+            return image.transpose(ImageProcessor.TRANSPOSE[angle])
         return image.rotate(-angle, expand=True)
 
     @staticmethod
-    def save_image(image, output_path, format='png', quality=95):
+    def build_pipeline(resize, rotation, stages=()):
+        """构建批量处理使用的变换流水线：转为 RGB → 旋转 → 缩放 → 其他阶段
+
+        resize 为 ResizeStage 或缩放百分比。
+        """
+        if not isinstance(resize, ResizeStage):
+            resize = ResizeStage(resize)
+        return Pipeline([ConvertStage('RGB'), RotateStage(rotation), resize, *stages])
+
+    @staticmethod
+    def can_copy(image, pipeline, output_format):
+        """是否可以直接复制源文件（流水线对该图片无任何操作且格式相同）"""
+        return (output_format.lower() in ImageProcessor.COPY_FORMATS.get(image.format, ())
+                and not pipeline.plan(image.size, image.mode))
+
+    @staticmethod
+    def encode_image(image, format='png', quality=95, profile='balanced', lossless=False):
+        """将图片编码为字节
+
+        profile 为 ENCODER_PROFILES 中的编码配置；quality 用于 JPEG 和有损 WebP，
+        lossless 只对 WebP 有效。
+        """
+        name = ImageProcessor.FORMAT_NAMES.get(format.lower(), format.upper())
+        options = dict(ImageProcessor.ENCODER_PROFILES[profile].get(name, {}))
+        if name == 'JPEG':
+            options['quality'] = quality
+        elif name == 'WEBP':
+            options['quality'] = quality
+            options['lossless'] = lossless
+
+        buffer = io.BytesIO()
+        image.save(buffer, name, **options)
+        return buffer.getvalue()
+
+    @staticmethod
+    def compare_encoder_profiles(images, format='png', quality=95, lossless=False):
+        """用各编码配置编码同一组图片，返回 {配置: 统计}
+
+        统计包括图片数、总字节数、编码总耗时及平均每张的字节数和耗时，
+        用于按数据集选择速度和大小的折中。
+        """
+        report = {}
+        for profile in ImageProcessor.ENCODER_PROFILES:
+            total_bytes = 0
+            start = time.perf_counter()
+            for image in images:
+                total_bytes += len(ImageProcessor.encode_image(image, format, quality,
+                                                               profile, lossless))
+            seconds = time.perf_counter() - start
+            count = len(images)
+            report[profile] = {
+                'images': count,
+                'bytes': total_bytes,
+                'encode_s': round(seconds, 4),
+                'bytes_per_image': round(total_bytes / count) if count else 0,
+                'ms_per_image': round(seconds / count * 1000, 2) if count else 0.0
+            }
+        return report
+
+    @staticmethod
+    def save_image(image, output_path, format='png', quality=95, profile='balanced',
+                   lossless=False):
         """保存图片"""
         try:
-            if format.lower() in ['jpg', 'jpeg']:
-                image.save(output_path, 'JPEG', quality=quality)
-            else:
-                image.save(output_path, format.upper())
+            data = ImageProcessor.encode_image(image, format, quality, profile, lossless)
+            with open(output_path, 'wb') as f:
+                f.write(data)
             return True
         except Exception as e:
             print(f"Error saving image {output_path}: {e}")
-            return False
\ No newline at end of file
+            return False
+
+
+class Stage:
+    """变换阶段基类
+
+    子类实现 apply，并按需要声明输出尺寸/模式、是否为空操作、
+    能否与相邻阶段融合、是否应提前执行，供 Pipeline 规划使用。
+    NAME 用于耗时统计。
+    """
+
+    NAME = 'stage'
+
+    def output_size(self, size):
+        """输出尺寸"""
+        return size
+
+    def output_mode(self, mode):
+        """输出模式"""
+        return mode
+
+    def is_noop(self, size, mode):
+        """对给定尺寸和模式的图片是否无任何作用"""
+        return False
+
+    def fuse(self, other):
+        """与紧随其后的 other 融合为一个阶段，不能融合时返回 None"""
+        return None
+
+    def should_precede(self, other, mode):
+        """是否应与前一个阶段 other 交换顺序（结果不变但更快）"""
+        return False
+
+    def apply(self, image):
+        """执行变换"""
+        raise NotImplementedError
+
+
+class ConvertStage(Stage):
+    """颜色模式转换"""
+
+    NAME = 'convert'
+
+    # 在几何变换之后转换结果相同的 (源模式, 目标模式)
+    DEFERRABLE = {('L', 'RGB')}
+
+    def __init__(self, mode):
+        self.mode = mode
+
+    def output_mode(self, mode):
+        return self.mode
+
+    def is_noop(self, size, mode):
+        return mode == self.mode
+
+    def apply(self, image):
+        if image.mode == self.mode:
+            return image
+        return image.convert(self.mode)
+
+
+class ResizeStage(Stage):
+    """缩放
+
+    mode 为 percent（按 scale_percent 等比例缩放）、max_side（最长边不超过 target，
+    不放大）、short_side（最短边缩放到 target）或 exact（缩放到 target = (宽, 高)）。
+    profile 为 ImageProcessor.RESAMPLING 中的重采样配置。
+    """
+
+    NAME = 'resize'
+    MODES = ('percent', 'max_side', 'short_side', 'exact')
+
+    def __init__(self, scale_percent=100, mode='percent', target=None, profile='best'):
+        self.scale_percent = scale_percent
+        self.mode = mode
+        self.target = tuple(target) if mode == 'exact' else target
+        self.profile = profile
+
+    @classmethod
+    def from_settings(cls, settings):
+        """由批量处理设置创建"""
+        mode = settings.get('resize_mode', 'percent')
+        target = None
+        if mode == 'exact':
+            target = (settings['target_width'], settings['target_height'])
+        elif mode in ('max_side', 'short_side'):
+            target = settings['target_size']
+        return cls(settings['scale_percent'], mode, target, settings.get('resample', 'best'))
+
+    def describe(self):
+        """用于日志的缩放描述"""
+        if self.mode == 'max_side':
+            return f"max side {self.target}px"
+        if self.mode == 'short_side':
+            return f"short side {self.target}px"
+        if self.mode == 'exact':
+            return f"{self.target[0]}x{self.target[1]}"
+        return f"{self.scale_percent:g}%"
+
+    def output_size(self, size):
+        width, height = size
+        if self.mode == 'exact':
+            return self.target
+        if self.mode == 'max_side':
+            scale = min(1.0, self.target / max(width, height))
+        elif self.mode == 'short_side':
+            scale = self.target / min(width, height)
+        else:
+            return (int(width * self.scale_percent / 100),
+                    int(height * self.scale_percent / 100))
+        return max(1, round(width * scale)), max(1, round(height * scale))
+
+    def is_noop(self, size, mode):
+        if self.mode == 'percent':
+            return self.scale_percent == 100
+        return tuple(self.output_size(size)) == tuple(size)
+
+    def fuse(self, other):
+        if (isinstance(other, ResizeStage) and self.mode == other.mode == 'percent'
+                and self.profile == other.profile):
+            return ResizeStage(self.scale_percent * other.scale_percent / 100,
+                               profile=self.profile)
+        return None
+
+    def should_precede(self, other, mode):
+        # 缩小后再旋转（按边长缩放的结果与方向无关）；灰度图先缩放再转 RGB
+        if isinstance(other, RotateStage):
+            if not other.is_right_angle:
+                return False
+            if self.mode == 'percent':
+                return self.scale_percent < 100
+            return self.mode in ('max_side', 'short_side')
+        if isinstance(other, ConvertStage):
+            return (mode, other.mode) in ConvertStage.DEFERRABLE
+        return False
+
+    def apply(self, image):
+        return ImageProcessor.resize_image(image, profile=self.profile,
+                                           size=self.output_size(image.size))
+
+
+class RotateStage(Stage):
+    """顺时针旋转"""
+
+    NAME = 'rotate'
+
+    def __init__(self, angle):
+        self.angle = angle % 360
+
+    @property
+    def is_right_angle(self):
+        return self.angle % 90 == 0
+
+    def output_size(self, size):
+        if self.angle in (90, 270):
+            return size[1], size[0]
+        if self.is_right_angle:
+            return size
+        rad = math.radians(self.angle)
+        cos, sin = abs(math.cos(rad)), abs(math.sin(rad))
+        return (math.ceil(size[0] * cos + size[1] * sin),
+                math.ceil(size[0] * sin + size[1] * cos))
+
+    def is_noop(self, size, mode):
+        return self.angle == 0
+
+    def fuse(self, other):
+        if isinstance(other, RotateStage):
+            return RotateStage(self.angle + other.angle)
+        return None
+
+    def should_precede(self, other, mode):
+        # 灰度图先旋转再转 RGB
+        return (isinstance(other, ConvertStage) and self.is_right_angle
+                and (mode, other.mode) in ConvertStage.DEFERRABLE)
+
+    def apply(self, image):
+        return ImageProcessor.rotate_image(image, self.angle)
+
+
+class CropStage(Stage):
+    """裁剪，box 为 (left, top, right, bottom)"""
+
+    NAME = 'crop'
+
+    def __init__(self, box):
+        self.box = tuple(box)
+
+    def output_size(self, size):
+        left, top, right, bottom = self.box
+        return right - left, bottom - top
+
+    def is_noop(self, size, mode):
+        return self.box == (0, 0, size[0], size[1])
+
+    def apply(self, image):
+        return image.crop(self.box)
+
+
+class PadStage(Stage):
+    """四周填充"""
+
+    NAME = 'pad'
+
+    def __init__(self, left, top, right, bottom, fill=0):
+        self.padding = (left, top, right, bottom)
+        self.fill = fill
+
+    def output_size(self, size):
+        left, top, right, bottom = self.padding
+        return size[0] + left + right, size[1] + top + bottom
+
+    def is_noop(self, size, mode):
+        return not any(self.padding)
+
+    def apply(self, image):
+        canvas = Image.new(image.mode, self.output_size(image.size), self.fill)
+        canvas.paste(image, self.padding[:2])
+        return canvas
+
+
+class LetterboxStage(Stage):
+    """等比例缩放到 width x height 以内并居中填充到该尺寸（一次重采样、一次粘贴）"""
+
+    NAME = 'letterbox'
+
+    def __init__(self, width, height, fill=0):
+        self.size = (width, height)
+        self.fill = fill
+
+    def output_size(self, size):
+        return self.size
+
+    def is_noop(self, size, mode):
+        return tuple(size) == self.size
+
+    def apply(self, image):
+        width, height = self.size
+        scale = min(width / image.width, height / image.height)
+        fitted = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+        if fitted != image.size:
+            image = image.resize(fitted, Image.Resampling.LANCZOS)
+        if fitted == self.size:
+            return image
+
+        canvas = Image.new(image.mode, self.size, self.fill)
+        canvas.paste(image, ((width - fitted[0]) // 2, (height - fitted[1]) // 2))
+        return canvas
+
+
+class Pipeline:
+    """变换流水线
+
+    按声明顺序描述变换，执行前针对具体图片规划：融合相邻的同类阶段，
+    在结果不变的前提下调整顺序（如先缩小再旋转），并跳过空操作。
+    """
+
+    def __init__(self, stages):
+        self.stages = list(stages)
+
+    def plan(self, size, mode):
+        """返回对给定尺寸和模式的图片实际需要执行的阶段"""
+        stages = list(self.stages)
+        for _ in range(len(stages) * len(stages) + 1):
+            optimized = self._drop_noops(self._reorder(self._fuse(stages), mode), size, mode)
+            if optimized == stages:
+                break
+            stages = optimized
+        return stages
+
+    def apply(self, image, timing=NULL_TIMING):
+        """执行流水线（解码和各阶段耗时计入 timing）
+
+        图片尚未解码时，若缩放配置允许，JPEG 以降低的分辨率解码。
+        """
+        stages = self.plan(image.size, image.mode)
+        with timing.stage('decode'):
+            stages = self._draft(image, stages)
+            image.load()
+        for stage in stages:
+            with timing.stage(stage.NAME):
+                image = stage.apply(image)
+        return image
+
+    @staticmethod
+    def _draft(image, stages):
+        """在缩放之前只有模式转换和直角旋转时，按缩放目标降低 JPEG 解码分辨率
+
+        降低分辨率后，缩放阶段替换为按原尺寸计算好的固定尺寸缩放。
+        """
+        if image.format != 'JPEG':
+            return stages
+        size = image.size
+        for position, stage in enumerate(stages):
+            if isinstance(stage, ResizeStage):
+                break
+            if not (isinstance(stage, ConvertStage)
+                    or isinstance(stage, RotateStage) and stage.is_right_angle):
+                return stages
+            size = stage.output_size(size)
+        else:
+            return stages
+
+        resize = stages[position]
+        margin = ImageProcessor.RESAMPLING[resize.profile]['draft_margin']
+        if margin is None:
+            return stages
+        target = resize.output_size(size)
+        # 还原到源图方向
+        if size != image.size:
+            target = (target[1], target[0])
+        if image.draft(image.mode, (target[0] * margin, target[1] * margin)) is None:
+            return stages
+
+        pinned = ResizeStage(mode='exact', target=resize.output_size(size), profile=resize.profile)
+        return stages[:position] + [pinned] + stages[position + 1:]
+
+    @staticmethod
+    def _fuse(stages):
+        """融合相邻的同类阶段"""
+        fused = []
+        for stage in stages:
+            merged = fused[-1].fuse(stage) if fused else None
+            if merged is not None:
+                fused[-1] = merged
+            else:
+                fused.append(stage)
+        return fused
+
+    @staticmethod
+    def _reorder(stages, mode):
+        """交换结果不变且更快的相邻阶段（每次一轮冒泡）"""
+        stages = list(stages)
+        for i in range(1, len(stages)):
+            # mode 为 stages[i - 1] 的输入模式
+            if stages[i].should_precede(stages[i - 1], mode):
+                stages[i - 1], stages[i] = stages[i], stages[i - 1]
+            mode = stages[i - 1].output_mode(mode)
+        return stages
+
+    @staticmethod
+    def _drop_noops(stages, size, mode):
+        """跳过空操作"""
+        kept = []
+        for stage in stages:
+            if stage.is_noop(size, mode):
+                continue
+            kept.append(stage)
+            size = stage.output_size(size)
+            mode = stage.output_mode(mode)
+        return kept
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from core.work_shard import tagged
+import hashlib
+import json
+import os
+
+
+class RunManifest:
+    """批量处理完成清单
+
+    保存在输出文件夹中的 JSON Lines 文件，每成功输出一张图片追加一条记录：
+    输入路径、输入大小、修改时间、设置哈希、输出文件名。
+    重新运行时，输入和设置都未变化且输出文件仍然存在的图片可以直接跳过；
+    若只是序号发生变化，则把已有输出重命名为新的文件名，无需重新处理。
+    多节点分片处理时每个分片使用单独的清单（文件名带分片标记）。
+    """
+
+    FILE_NAME = ".processing_manifest.jsonl"
+    TEMP_PREFIX = ".resume-"
+    FSYNC_INTERVAL = 100
+
+    # 不影响输出内容的设置项（文件名由输出文件名单独校验）
+    IGNORED_SETTINGS = ('input_folder', 'output_folder', 'prefix', 'start_number',
+                        'padding', 'workers', 'resume', 'profile', 'output_sink',
+                        'shard_size_mb', 'streaming', 'io_threads', 'work_shard',
+                        'work_shards')
+
+    def __init__(self, output_folder, tag=''):
+        self.output_folder = output_folder
+        self.tag = tag
+        self.path = os.path.join(output_folder, tagged(self.FILE_NAME, tag))
+        self.by_input = {}  # 输入路径 -> 最新记录
+        self.owner = {}  # 输出文件名 -> 最后写入它的输入路径
+        self._unsynced = 0
+
+        line_count = self._load()
+        if line_count > 2 * len(self.by_input) + self.FSYNC_INTERVAL:
+            self._compact()
+        self.file = open(self.path, 'a', encoding='utf-8')
+
+    def _load(self):
+        """读取清单，返回行数（损坏的行被忽略）"""
+        if not os.path.exists(self.path):
+            return 0
+        line_count = 0
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line_count += 1
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if record['input'] is None:
+                    self.owner.pop(record['output'], None)
+                    continue
+                self.by_input[record['input']] = record
+                self.owner[record['output']] = record['input']
+        return line_count
+
+    def _compact(self):
+        """只保留每个输入的最新记录"""
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for record in self.by_input.values():
+                if self.owner.get(record['output']) == record['input']:
+                    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        os.replace(tmp_path, self.path)
+
+    @classmethod
+    def settings_hash(cls, settings, rotation):
+        """计算影响输出内容的设置的哈希"""
+        relevant = {key: value for key, value in settings.items()
+                    if key not in cls.IGNORED_SETTINGS}
+        relevant['rotation'] = rotation
+        data = json.dumps(relevant, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha1(data.encode('utf-8')).hexdigest()
+
+    def find(self, input_path, settings_hash):
+        """查找可复用的输出文件名，没有时返回 None
+
+        要求输入的大小和修改时间、设置哈希一致，且输出文件存在并且最后一次由该输入写入。
+        """
+        record = self.by_input.get(input_path)
+        if record is None or record['settings'] != settings_hash:
+            return None
+        if self.owner.get(record['output']) != input_path:
+            return None
+        try:
+            st = os.stat(input_path)
+        except OSError:
+            return None
+        if st.st_size != record['size'] or st.st_mtime_ns != record['mtime']:
+            return None
+        if not os.path.exists(os.path.join(self.output_folder, record['output'])):
+            return None
+        return record['output']
+
+    def relocate(self, moves):
+        """把已有输出重命名为新的文件名
+
+        moves 为 [(输入路径, 旧文件名, 新文件名), ...]。先全部移到临时文件名再改为新名，
+        避免新旧文件名互相覆盖。返回成功重命名的 [(输入路径, 新文件名), ...]。
+        """
+        staged = []
+        for i, (input_path, old_name, new_name) in enumerate(moves):
+            tmp_name = f"{self.TEMP_PREFIX}{self.tag}{i}.tmp"
+            try:
+                os.replace(os.path.join(self.output_folder, old_name),
+                           os.path.join(self.output_folder, tmp_name))
+                staged.append((input_path, tmp_name, new_name))
+            except OSError as e:
+                print(f"Error renaming {old_name}: {e}")
+
+        done = []
+        for input_path, tmp_name, new_name in staged:
+            try:
+                os.replace(os.path.join(self.output_folder, tmp_name),
+                           os.path.join(self.output_folder, new_name))
+                done.append((input_path, new_name))
+            except OSError as e:
+                print(f"Error renaming {tmp_name}: {e}")
+        return done
+
+    def record(self, input_path, output_name, settings_hash):
+        """记录一张已完成的图片"""
+        try:
+            st = os.stat(input_path)
+        except OSError:
+            return
+        record = {
+            'input': input_path,
+            'size': st.st_size,
+            'mtime': st.st_mtime_ns,
+            'settings': settings_hash,
+            'output': output_name
+        }
+        self.by_input[input_path] = record
+        self.owner[output_name] = input_path
+        self._append(record)
+
+    def release(self, output_name):
+        """声明输出文件即将被覆盖或移动，原记录不再有效"""
+        if self.owner.pop(output_name, None) is not None:
+            self._append({'input': None, 'output': output_name})
+
+    def sync(self):
+        """将已追加的记录同步到磁盘"""
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self._unsynced = 0
+
+    def _append(self, record):
+        self.file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self.file.flush()
+        self._unsynced += 1
+        if self._unsynced >= self.FSYNC_INTERVAL:
+            self.sync()
+
+    def close(self):
+        """同步并关闭清单"""
+        if self.file.closed:
+            return
+        self.sync()
+        self.file.close()
@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
+from utils.config import Config
+import hashlib
+import os
+import sqlite3
+
+ORIENTATION_TAG = 0x0112
+
+
+class ImageMetadata:
+    """图片元数据（列式存储，索引与 CurationState 一致）
+
+    宽、高、文件大小、EXIF 方向、格式和模式各占一列，排序和筛选只访问需要的列。
+    格式和模式保存为编号，对应的名称在 formats / modes 中。
+    无法识别的图片宽高为 0。
+    """
+
+    SORT_KEYS = ('name', 'pixels', 'width', 'height', 'size', 'format')
+
+    def __init__(self, count=0):
+        self.width = array('I', [0]) * count
+        self.height = array('I', [0]) * count
+        self.size = array('Q', [0]) * count
+        self.orientation = bytearray(count)
+        self.format = bytearray(count)
+        self.mode = bytearray(count)
+        self.known = bytearray(count)
+        self.formats = ['']
+        self.modes = ['']
+        self._format_codes = {'': 0}
+        self._mode_codes = {'': 0}
+
+    def __len__(self):
+        return len(self.known)
+
+    def set(self, index, size, width, height, mode, format, orientation):
+        """设置一张图片的元数据"""
+        self.size[index] = size
+        self.width[index] = width
+        self.height[index] = height
+        code = self._mode_codes.get(mode)
+        self.mode[index] = code if code is not None else _add_code(self.modes, self._mode_codes, mode)
+        code = self._format_codes.get(format)
+        self.format[index] = (code if code is not None
+                              else _add_code(self.formats, self._format_codes, format))
+        self.orientation[index] = orientation
+        self.known[index] = 1
+
+    def get(self, index):
+        """返回元数据字典，尚未读取时返回 None"""
+        if not self.known[index]:
+            return None
+        return {
+            'width': self.width[index],
+            'height': self.height[index],
+            'size': self.size[index],
+            'mode': self.modes[self.mode[index]],
+            'format': self.formats[self.format[index]],
+            'orientation': self.orientation[index]
+        }
+
+    def view_order(self, sort_key='name', descending=False, format=None, min_side=0):
+        """排序和筛选后的图片索引
+
+        sort_key 为 SORT_KEYS 之一（'name' 为扫描顺序），format 为格式名称，
+        min_side 为最短边的下限。返回 array('I')；未排序也未筛选时返回 None。
+        只生成显示顺序，不改变图片本身的索引（批量处理的序号仍按扫描顺序）。
+        """
+        if sort_key not in self.SORT_KEYS:
+            raise ValueError(f"不支持的排序方式: {sort_key}")
+        if sort_key == 'name' and not descending and not format and not min_side:
+            return None
+
+        indices = range(len(self))
+        if format or min_side:
+            code = self.formats.index(format) if format in self.formats else -1
+            width, height, formats = self.width, self.height, self.format
+            indices = [i for i in indices
+                       if (not format or formats[i] == code)
+                       and min(width[i], height[i]) >= min_side]
+
+        if sort_key == 'name':
+            order = indices[::-1] if descending else indices
+        else:
+            order = sorted(indices, key=self._sort_key(sort_key), reverse=descending)
+        return array('I', order)
+
+    def _sort_key(self, sort_key):
+        if sort_key == 'pixels':
+            width, height = self.width, self.height
+            return lambda i: width[i] * height[i]
+        if sort_key == 'format':
+            names = [name.lower() for name in self.formats]
+            formats = self.format
+            return lambda i: names[formats[i]]
+        return getattr(self, sort_key).__getitem__
+
+
+class MetadataIndex:
+    """图片元数据索引（SQLite）
+
+    Image.open 只读取文件头，不解码像素：多线程并行获取尺寸、模式、格式和 EXIF 方向，
+    连同文件大小和修改时间保存在缓存目录中（路径相对根目录，不在数据集中写入文件）。
+    路径以 surrogateescape 编码为字节保存，文件名不是合法 UTF-8 时也能保存。
+    每次加载时 stat 每张图片，大小和修改时间未变的直接使用索引中的记录，
+    再次打开文件夹时只需读取新增或修改的图片的文件头。
+    """
+
+    VERSION = 2
+    BATCH_SIZE = 1000
+
+    def __init__(self, root, workers=None, index_path=None):
+        self.prefix = os.path.join(root, '')
+        self.workers = workers or min(32, (os.cpu_count() or 1) * 4)
+        if index_path is None:
+            digest = hashlib.sha1(os.path.abspath(root).encode('utf-8', 'surrogateescape'))
+            index_path = os.path.join(Config.cache_dir("metadata"), f"{digest.hexdigest()}.sqlite")
+        self.path = index_path
+
+    def build(self, paths, progress_callback=None):
+        """加载索引并读取新增或修改的图片，返回 ImageMetadata
+
+        paths 为按顺序排列的图片路径（如 PathTable），以 root 为前缀。
+        progress_callback(done, total) 报告需要读取文件头的图片的进度，
+        返回 False 时取消（已读取的部分仍写入索引），返回 None。
+        """
+        connection = self._connect()
+        try:
+            metadata = ImageMetadata(len(paths))
+            stale, removed = self._load(connection, paths, metadata)
+            connection.executemany("DELETE FROM images WHERE path = ?",
+                                   ((path,) for path in removed))
+            connection.commit()
+
+            total = len(stale)
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                for start in range(0, total, self.BATCH_SIZE):
+                    batch = stale[start:start + self.BATCH_SIZE]
+                    headers = executor.map(read_header, [paths[i] for i, _ in batch])
+                    rows = []
+                    for (i, (size, mtime)), header in zip(batch, headers):
+                        metadata.set(i, size, *header)
+                        rows.append((self._relative(paths[i]), size, mtime) + header)
+                    connection.executemany(
+                        "INSERT OR REPLACE INTO images VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+                    connection.commit()
+
+                    done = start + len(batch)
+                    if progress_callback and progress_callback(done, total) is False:
+                        return None
+            return metadata
+        finally:
+            connection.close()
+
+    def _connect(self):
+        """打开索引数据库，版本不符时重建"""
+        connection = None
+        try:
+            connection = sqlite3.connect(self.path)
+            version = connection.execute("PRAGMA user_version").fetchone()[0]
+            if version != self.VERSION:
+                connection.execute("DROP TABLE IF EXISTS images")
+                connection.execute(f"PRAGMA user_version = {self.VERSION}")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS images ("
+                "path BLOB PRIMARY KEY, size INTEGER, mtime INTEGER, "
+                "width INTEGER, height INTEGER, mode TEXT, format TEXT, "
+                "orientation INTEGER)")
+            connection.commit()
+            return connection
+        except sqlite3.Error as e:
+            if connection is not None:
+                connection.close()
+            raise OSError(f"无法打开元数据索引 {self.path}: {e}") from e
+
+    def _load(self, connection, paths, metadata):
+        """按路径顺序对照索引和图片列表，填入未变化的记录
+
+        返回 (需要读取的 [(索引, (大小, 修改时间))], 已不存在的图片的路径)。
+        每张图片都重新 stat：文件被原地覆盖时所在目录的修改时间不变，
+        不能使用扫描文件夹时复用的记录。
+        """
+        stale = []
+        removed = []
+        rows = connection.execute(
+            "SELECT path, size, mtime, width, height, mode, format, orientation "
+            "FROM images ORDER BY path")
+        row = next(rows, None)
+        for i, path in enumerate(paths):
+            relative = self._relative(path)
+            while row is not None and row[0] < relative:
+                removed.append(row[0])
+                row = next(rows, None)
+
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            file_stat = (st.st_size, st.st_mtime_ns)
+
+            if row is not None and row[0] == relative:
+                current, row = row, next(rows, None)
+                if (current[1], current[2]) == file_stat:
+                    metadata.set(i, current[1], *current[3:])
+                    continue
+            stale.append((i, file_stat))
+
+        while row is not None:
+            removed.append(row[0])
+            row = next(rows, None)
+        return stale, removed
+
+    def _relative(self, path):
+        """索引中保存的路径：相对根目录，按 surrogateescape 编码为字节"""
+        if path.startswith(self.prefix):
+            path = path[len(self.prefix):]
+        return path.encode('utf-8', 'surrogateescape')
+
+
+def read_header(path):
+    """只读取文件头，返回 (宽, 高, 模式, 格式, EXIF 方向)；无法识别时宽高为 0"""
+    try:
+        with Image.open(path) as image:
+            return (image.width, image.height, image.mode, image.format or '',
+                    _orientation(image))
+    except Exception:
+        return 0, 0, '', '', 0
+
+
+def _orientation(image):
+    """EXIF 方向（1-8），没有 EXIF 时为 1
+
+    只读取打开文件时已解析的 EXIF：PNG 等格式在 info 中没有 EXIF 时，
+    getexif 会解码整张图片。
+    """
+    if 'exif' not in image.info and image.format != 'TIFF':
+        return 1
+    try:
+        return int(image.getexif().get(ORIENTATION_TAG, 1))
+    except Exception:
+        return 1
+
+
+def _add_code(names, codes, name):
+    """为新的名称分配编号"""
+    codes[name] = len(names)
+    names.append(name)
+    return codes[name]
@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from bisect import bisect_right
+from core.work_shard import shard_tag, tagged
+import io
+import json
+import os
+import shutil
+import tarfile
+
+
+class OutputSink:
+    """输出目标基类
+
+    write 写入编码后的图片，copy 直接复制源文件。
+    ordered 为 True 的输出目标要求按序号顺序写入，且只能在主进程中写入。
+    """
+
+    ordered = False
+
+    def write(self, name, data, number):
+        raise NotImplementedError
+
+    def copy(self, name, source_path, number):
+        with open(source_path, 'rb') as f:
+            data = f.read()
+        self.write(name, data, number)
+        return len(data)
+
+    def close(self):
+        pass
+
+
+class FileSink(OutputSink):
+    """每张图片输出为输出文件夹中的单独文件"""
+
+    def __init__(self, output_folder):
+        self.output_folder = output_folder
+
+    def write(self, name, data, number):
+        with open(os.path.join(self.output_folder, name), 'wb') as f:
+            f.write(data)
+
+    def copy(self, name, source_path, number):
+        shutil.copyfile(source_path, os.path.join(self.output_folder, name))
+        return os.path.getsize(source_path)
+
+
+class MemorySink(OutputSink):
+    """暂存输出，用于子进程把结果交给主进程按顺序写入"""
+
+    def __init__(self):
+        self.outputs = []
+
+    def write(self, name, data, number):
+        self.outputs.append((name, data, number))
+
+    def take(self):
+        outputs, self.outputs = self.outputs, []
+        return outputs
+
+
+class ShardSink(OutputSink):
+    """分片 tar 归档输出
+
+    图片按顺序写入 {prefix}shard_00000.tar、{prefix}shard_00001.tar ……，
+    每个分片不超过 max_bytes（单张图片超过时独占一个分片）。
+    每个分片有对应的 .idx.json 索引，记录每个样本的序号、文件名、
+    数据在 tar 中的偏移和大小；shards.json 记录各分片的序号范围。
+    多节点分片处理时，分片文件名和 shards.json 带节点的分片标记，
+    由 merge_shard_manifests 合并为 shards.json。
+    """
+
+    ordered = True
+    MANIFEST = "shards.json"
+    DEFAULT_MAX_BYTES = 1024 * 1024 * 1024
+
+    def __init__(self, output_folder, prefix='', max_bytes=DEFAULT_MAX_BYTES, tag=''):
+        self.output_folder = output_folder
+        self.prefix = f"{prefix}{tag}_" if tag else prefix
+        self.max_bytes = max_bytes
+        self.manifest_name = tagged(self.MANIFEST, tag)
+        self.shards = []
+        self._tar = None
+        self._samples = []
+        self._remove_previous()
+
+    def write(self, name, data, number):
+        info = tarfile.TarInfo(name)
+        info.size = len(data)
+        # 成员头（文件名超过 ustar 的 100 字节时另有 PAX 扩展头）和按块对齐的数据
+        header = info.tobuf(tarfile.PAX_FORMAT, tarfile.ENCODING, 'surrogateescape')
+        entry_size = len(header) + _padded(len(data))
+        if (self._tar is not None
+                and _archive_size(self._tar.offset + entry_size) > self.max_bytes):
+            self._close_shard()
+        if self._tar is None:
+            self._open_shard()
+
+        self._tar.addfile(info, io.BytesIO(data))
+        # 数据紧邻成员头，结束位置按块对齐
+        offset = self._tar.offset - _padded(len(data))
+        self._samples.append((number, name, offset, len(data)))
+
+    def close(self):
+        self._close_shard()
+        self._save_manifest()
+
+    def _shard_name(self, index):
+        return f"{self.prefix}shard_{index:05d}"
+
+    def _open_shard(self):
+        name = self._shard_name(len(self.shards))
+        self._tar = tarfile.open(os.path.join(self.output_folder, name + ".tar"), 'w',
+                                 format=tarfile.PAX_FORMAT)
+        self._samples = []
+
+    def _close_shard(self):
+        if self._tar is None:
+            return
+        self._tar.close()
+        self._tar = None
+
+        name = self._shard_name(len(self.shards))
+        with open(os.path.join(self.output_folder, name + ".idx.json"), 'w',
+                  encoding='utf-8') as f:
+            json.dump({'shard': name + ".tar", 'samples': self._samples}, f,
+                      ensure_ascii=False)
+
+        numbers = [sample[0] for sample in self._samples]
+        self.shards.append({
+            'shard': name + ".tar",
+            'index': name + ".idx.json",
+            'first': min(numbers),
+            'last': max(numbers),
+            'count': len(self._samples),
+            'bytes': os.path.getsize(os.path.join(self.output_folder, name + ".tar"))
+        })
+        self._samples = []
+
+    def _save_manifest(self):
+        path = os.path.join(self.output_folder, self.manifest_name)
+        with open(path + ".tmp", 'w', encoding='utf-8') as f:
+            json.dump({'shards': self.shards}, f, indent=2, ensure_ascii=False)
+        os.replace(path + ".tmp", path)
+
+    def _remove_previous(self):
+        """删除上次运行生成的分片，避免残留的旧分片混入"""
+        path = os.path.join(self.output_folder, self.manifest_name)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                shards = json.load(f)['shards']
+        except (OSError, ValueError, KeyError):
+            return
+        for shard in shards:
+            for name in (shard['shard'], shard['index']):
+                try:
+                    os.remove(os.path.join(self.output_folder, name))
+                except OSError:
+                    pass
+        os.remove(path)
+
+
+class ShardReader:
+    """按序号随机读取分片归档中的样本"""
+
+    def __init__(self, output_folder):
+        self.output_folder = output_folder
+        with open(os.path.join(output_folder, ShardSink.MANIFEST), 'r', encoding='utf-8') as f:
+            self.shards = sorted(json.load(f)['shards'], key=lambda shard: shard['first'])
+        self._firsts = [shard['first'] for shard in self.shards]
+        self._indexes = {}
+
+    def __len__(self):
+        return sum(shard['count'] for shard in self.shards)
+
+    def read(self, number):
+        """返回 (文件名, 数据)，序号不存在时抛出 KeyError"""
+        position = bisect_right(self._firsts, number) - 1
+        if position < 0 or number > self.shards[position]['last']:
+            raise KeyError(number)
+        shard = self.shards[position]
+        name, offset, size = self._index(shard).get(number, (None, None, None))
+        if name is None:
+            raise KeyError(number)
+        with open(os.path.join(self.output_folder, shard['shard']), 'rb') as f:
+            f.seek(offset)
+            return name, f.read(size)
+
+    def _index(self, shard):
+        index = self._indexes.get(shard['index'])
+        if index is None:
+            with open(os.path.join(self.output_folder, shard['index']), 'r',
+                      encoding='utf-8') as f:
+                samples = json.load(f)['samples']
+            index = {number: (name, offset, size) for number, name, offset, size in samples}
+            self._indexes[shard['index']] = index
+        return index
+
+
+def create_sink(settings):
+    """根据设置创建输出目标"""
+    if settings.get('output_sink', 'files') == 'shards':
+        max_bytes = settings.get('shard_size_mb', 1024) * 1024 * 1024
+        return ShardSink(settings['output_folder'], settings['prefix'], max_bytes,
+                         shard_tag(settings))
+    return FileSink(settings['output_folder'])
+
+
+def merge_shard_manifests(output_folder):
+    """把各节点的 shards.part-K-of-N.json 合并为 shards.json，返回合并的清单数"""
+    stem, ext = os.path.splitext(ShardSink.MANIFEST)
+    shards = []
+    merged = 0
+    for name in sorted(os.listdir(output_folder)):
+        if name.startswith(stem + ".part-") and name.endswith(ext):
+            with open(os.path.join(output_folder, name), 'r', encoding='utf-8') as f:
+                shards.extend(json.load(f)['shards'])
+            merged += 1
+    if merged:
+        shards.sort(key=lambda shard: shard['first'])
+        path = os.path.join(output_folder, ShardSink.MANIFEST)
+        with open(path + ".tmp", 'w', encoding='utf-8') as f:
+            json.dump({'shards': shards}, f, indent=2, ensure_ascii=False)
+        os.replace(path + ".tmp", path)
+    return merged
+
+
+def _padded(size):
+    """按 tar 块大小对齐后的长度"""
+    return -(-size // tarfile.BLOCKSIZE) * tarfile.BLOCKSIZE
+
+
+def _archive_size(offset):
+    """成员写到 offset 处时关闭归档后的文件大小：加上结束标记的两个空块并按记录大小对齐"""
+    size = offset + 2 * tarfile.BLOCKSIZE
+    return -(-size // tarfile.RECORDSIZE) * tarfile.RECORDSIZE
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from core.worker_pool import PriorityWorkerPool
+from utils.lru_cache import LRUCache
+import threading
+
+
+class PreviewCache:
+    """预览图缓存
+
+    缓存已解码的预览图（按字节预算淘汰），并在后台预取当前图片前后的若干张。
+    跳转到其他位置时，尚未开始的预取任务会被取消并按新位置重新排序。
+    """
+
+    CACHE_BYTES = 256 * 1024 * 1024
+
+    def __init__(self, image_loader, prefetch_count=3, cache_bytes=CACHE_BYTES, workers=2):
+        self.image_loader = image_loader
+        self.prefetch_count = prefetch_count
+        self.cache = LRUCache(cache_bytes, self._item_bytes)
+        self._inflight = {}  # path -> threading.Event
+        self._lock = threading.Lock()
+        self.pool = PriorityWorkerPool(self._load, workers=workers)
+
+    @staticmethod
+    def _item_bytes(item):
+        image, _ = item
+        return image.width * image.height * len(image.getbands())
+
+    def get(self, path):
+        """获取预览图，返回 (图片, 原始尺寸)；未缓存时同步解码"""
+        item = self.cache.get(path)
+        if item is not None:
+            return item
+
+        # 正在后台解码时等待其完成，避免重复解码
+        with self._lock:
+            event = self._inflight.get(path)
+        if event is not None:
+            event.wait()
+            item = self.cache.get(path)
+            if item is not None:
+                return item
+
+        item = self.image_loader.load_preview(path)
+        if item[0] is not None:
+            self.cache.put(path, item)
+        return item
+
+    def prefetch(self, paths):
+        """按给定顺序预取图片，取消之前尚未开始的预取"""
+        self.pool.clear()
+        for priority, path in enumerate(paths):
+            if path not in self.cache:
+                self.pool.submit(path, priority)
+
+    def prefetch_around(self, index, total, path_of):
+        """预取 index 前后各 prefetch_count 张（下一张优先），path_of(i) 返回第 i 张的路径"""
+        neighbors = []
+        for offset in range(1, self.prefetch_count + 1):
+            for i in (index + offset, index - offset):
+                if 0 <= i < total:
+                    neighbors.append(path_of(i))
+        self.prefetch(neighbors)
+
+    def clear(self):
+        """清空缓存并取消预取"""
+        self.pool.clear()
+        self.cache.clear()
+
+    def shutdown(self):
+        """停止后台线程"""
+        self.pool.shutdown(timeout=1.0)
+
+    def _load(self, path):
+        """工作线程：解码预览图"""
+        if path in self.cache:
+            return None
+        event = threading.Event()
+        with self._lock:
+            if path in self._inflight:
+                return None
+            self._inflight[path] = event
+        try:
+            item = self.image_loader.load_preview(path)
+            if item[0] is not None:
+                self.cache.put(path, item)
+        finally:
+            with self._lock:
+                del self._inflight[path]
+            event.set()
+        return None
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from core.work_shard import tagged
+import heapq
+import json
+import os
+import re
+
+
+class ProcessingLog:
+    """处理日志（JSON Lines，边处理边写入）
+
+    每张图片一条记录：
+        {"status": "processed", "number": 1, "input": ..., "output": ...,
+         "scale": "50%", "rotation": 90, "reused": false}
+        {"status": "skipped", "number": 2, "input": ..., "error": "..."}
+    写入有缓冲，每 FLUSH_INTERVAL 条刷新一次，内存占用与图片数量无关；
+    中断时已刷新的记录保留在文件中。
+    多节点分片处理时每个分片写入单独的日志（文件名带分片标记），由 merge_logs 合并。
+    """
+
+    FILENAME = "processing_log.jsonl"
+    FLUSH_INTERVAL = 256
+    PART_PATTERN = re.compile(r'^processing_log\.part-(\d+)-of-(\d+)\.jsonl$')
+
+    def __init__(self, output_folder, tag=''):
+        self.path = os.path.join(output_folder, tagged(self.FILENAME, tag))
+        self.file = open(self.path, 'w', encoding='utf-8', buffering=1 << 16)
+        self.unflushed = 0
+
+    def write(self, record):
+        """写入一条记录"""
+        self.file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self.unflushed += 1
+        if self.unflushed >= self.FLUSH_INTERVAL:
+            self.flush()
+
+    def flush(self):
+        self.file.flush()
+        self.unflushed = 0
+
+    def close(self):
+        if not self.file.closed:
+            self.file.close()
+
+
+def processed_record(number, input_path, output_filename, scale, rotation, reused=False):
+    """处理成功的记录，scale 为缩放描述（如 "50%"、"max side 512px"）"""
+    return {'status': 'processed', 'number': number, 'input': input_path,
+            'output': output_filename, 'scale': scale,
+            'rotation': rotation, 'reused': reused}
+
+
+def skipped_record(number, input_path, error=None):
+    """跳过（失败）的记录，error 为 None 表示保存失败"""
+    return {'status': 'skipped', 'number': number, 'input': input_path, 'error': error}
+
+
+def read_log(output_folder, filename=ProcessingLog.FILENAME):
+    """逐条读取处理日志，忽略中断时写了一半的最后一行"""
+    path = os.path.join(output_folder, filename)
+    if not os.path.exists(path):
+        return
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                yield json.loads(line)
+            except ValueError:
+                continue
+
+
+def format_processed_entry(input_path, output_filename, scale, rotation):
+    """生成处理日志条目"""
+    return (f"{input_path} → {output_filename} → "
+            f"scaled {scale}, rotated {rotation}°")
+
+
+def format_skipped_entry(input_path, error=None):
+    """生成跳过日志条目"""
+    if error is None:
+        return input_path
+    return f"{input_path} → Error:  {error}"
+
+
+def format_record(record):
+    """将记录转换为文本日志条目"""
+    if record['status'] == 'processed':
+        return format_processed_entry(record['input'], record['output'],
+                                      record['scale'], record['rotation'])
+    return format_skipped_entry(record['input'], record.get('error'))
+
+
+def write_text_logs(output_folder):
+    """由处理日志生成 processed_log.txt 和 skipped_files.txt（逐条转换）
+
+    没有跳过的图片时不生成 skipped_files.txt。
+    """
+    skip_file = None
+    log_path = os.path.join(output_folder, "processed_log.txt")
+    try:
+        with open(log_path, 'w', encoding='utf-8') as f:
+            f.write("处理日志\n")
+            f.write("=" * 80 + "\n\n")
+            for record in read_log(output_folder):
+                if record['status'] == 'processed':
+                    f.write(format_record(record) + "\n")
+                    continue
+
+                if skip_file is None:
+                    skip_path = os.path.join(output_folder, "skipped_files.txt")
+                    skip_file = open(skip_path, 'w', encoding='utf-8')
+                    skip_file.write("跳过的文件\n")
+                    skip_file.write("=" * 80 + "\n\n")
+                skip_file.write(format_record(record) + "\n")
+    finally:
+        if skip_file is not None:
+            skip_file.close()
+
+
+def merge_logs(output_folder):
+    """合并各分片的处理日志
+
+    按序号归并各分片的 processing_log.part-K-of-N.jsonl（逐条读取，内存占用与图片数量无关），
+    写入 processing_log.jsonl，再生成 processed_log.txt 和 skipped_files.txt。
+    返回汇总：分片数、缺失的分片、处理/跳过数量，以及序号的缺口和重复数。
+    找不到分片日志时抛出 FileNotFoundError，分片数不一致时抛出 ValueError。
+    """
+    parts = {}
+    counts = set()
+    for name in os.listdir(output_folder):
+        match = ProcessingLog.PART_PATTERN.match(name)
+        if match:
+            parts[int(match.group(1))] = name
+            counts.add(int(match.group(2)))
+    if not parts:
+        raise FileNotFoundError(f"没有找到分片处理日志: {output_folder}")
+    if len(counts) > 1:
+        raise ValueError(f"分片日志的分片数不一致: {sorted(counts)}")
+    count = counts.pop()
+
+    summary = {'parts': count, 'missing': [k for k in range(count) if k not in parts],
+               'processed': 0, 'skipped': 0, 'gaps': 0, 'duplicates': 0}
+    streams = [read_log(output_folder, parts[k]) for k in sorted(parts)]
+    path = os.path.join(output_folder, ProcessingLog.FILENAME)
+    previous = None
+    with open(path + ".tmp", 'w', encoding='utf-8', buffering=1 << 16) as f:
+        for record in heapq.merge(*streams, key=lambda record: record['number']):
+            number = record['number']
+            if previous is not None:
+                if number == previous:
+                    summary['duplicates'] += 1
+                elif number > previous + 1:
+                    summary['gaps'] += number - previous - 1
+            previous = number
+            summary[record['status']] += 1
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    os.replace(path + ".tmp", path)
+
+    write_text_logs(output_folder)
+    return summary
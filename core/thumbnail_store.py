@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from PIL import Image
+import json
+import mmap
+import os
+import threading
+
+
+class ThumbnailStore:
+    """持久化缩略图存储
+
+    所有缩略图以 RGB 原始像素存放在同一个内存映射的图集文件中，
+    每张占用一个固定大小的槽位；索引文件记录 路径 → (槽位, 宽, 高, 文件大小, 修改时间)。
+    文件大小或修改时间变化时缓存失效，重新生成的缩略图写回原槽位。
+    """
+
+    ATLAS_FILE = "thumbnails.atlas"
+    INDEX_FILE = "thumbnails.index.json"
+    GROW_SLOTS = 1024
+
+    def __init__(self, folder, slot_size=(160, 160)):
+        self.folder = folder
+        self.slot_size = tuple(slot_size)
+        self.slot_bytes = self.slot_size[0] * self.slot_size[1] * 3
+        self.entries = {}  # path -> [slot, width, height, size, mtime_ns]
+        self.dirty = False
+        self.lock = threading.Lock()
+
+        os.makedirs(folder, exist_ok=True)
+        self.atlas_path = os.path.join(folder, self.ATLAS_FILE)
+        self.index_path = os.path.join(folder, self.INDEX_FILE)
+
+        self._load_index()
+        self._open_atlas()
+
+    def _load_index(self):
+        """加载索引，尺寸不一致或文件损坏时重建"""
+        if not os.path.exists(self.index_path):
+            return
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if tuple(data['slot_size']) == self.slot_size:
+                self.entries = data['entries']
+        except Exception as e:
+            print(f"Error loading thumbnail index: {e}")
+            self.entries = {}
+
+    def _open_atlas(self):
+        """打开图集文件并建立内存映射"""
+        if not os.path.exists(self.atlas_path):
+            self.entries = {}
+            self.atlas_file = open(self.atlas_path, 'w+b')
+        else:
+            self.atlas_file = open(self.atlas_path, 'r+b')
+        if not self.entries:
+            self.atlas_file.truncate(0)
+        self.capacity = os.path.getsize(self.atlas_path) // self.slot_bytes
+        self.atlas = None
+        self._ensure_capacity(max(len(self.entries), 1))
+
+    def _ensure_capacity(self, slots):
+        """保证图集至少能容纳指定数量的槽位"""
+        if slots <= self.capacity and self.atlas is not None:
+            return
+        if slots > self.capacity:
+            self.capacity = max(slots, self.capacity + self.GROW_SLOTS)
+            if self.atlas is not None:
+                self.atlas.close()
+                self.atlas = None
+            self.atlas_file.truncate(self.capacity * self.slot_bytes)
+        self.atlas = mmap.mmap(self.atlas_file.fileno(), self.capacity * self.slot_bytes)
+
+    @staticmethod
+    def _stat_key(path):
+        """返回用于校验缓存的 (文件大小, 修改时间)"""
+        st = os.stat(path)
+        return st.st_size, st.st_mtime_ns
+
+    def get(self, path):
+        """读取缓存的缩略图，未命中或已失效时返回 None"""
+        with self.lock:
+            entry = self.entries.get(path)
+        if entry is None:
+            return None
+
+        try:
+            size, mtime = self._stat_key(path)
+        except OSError:
+            return None
+
+        slot, width, height, cached_size, cached_mtime = entry
+        if size != cached_size or mtime != cached_mtime:
+            return None
+
+        offset = slot * self.slot_bytes
+        with self.lock:
+            data = self.atlas[offset:offset + width * height * 3]
+        return Image.frombytes('RGB', (width, height), data)
+
+    def put(self, path, image):
+        """写入缩略图（RGB，且不超过槽位尺寸）"""
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
+        if image.width > self.slot_size[0] or image.height > self.slot_size[1]:
+            image = image.copy()
+            image.thumbnail(self.slot_size, Image.Resampling.LANCZOS)
+
+        try:
+            size, mtime = self._stat_key(path)
+        except OSError:
+            return
+
+        data = image.tobytes("raw", "RGB")
+        with self.lock:
+            entry = self.entries.get(path)
+            slot = entry[0] if entry else len(self.entries)
+            self._ensure_capacity(slot + 1)
+
+            offset = slot * self.slot_bytes
+            self.atlas[offset:offset + len(data)] = data
+            self.entries[path] = [slot, image.width, image.height, size, mtime]
+            self.dirty = True
+
+    def flush(self):
+        """将图集和索引写入磁盘"""
+        with self.lock:
+            if not self.dirty:
+                return
+            self.atlas.flush()
+
+            tmp_path = self.index_path + ".tmp"
+            try:
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump({'slot_size': list(self.slot_size), 'entries': self.entries},
+                              f, ensure_ascii=False)
+                os.replace(tmp_path, self.index_path)
+                self.dirty = False
+            except Exception as e:
+                print(f"Error saving thumbnail index: {e}")
+
+    def close(self):
+        """写入并关闭存储"""
+        self.flush()
+        with self.lock:
+            if self.atlas is not None:
+                self.atlas.close()
+                self.atlas = None
+            self.atlas_file.close()
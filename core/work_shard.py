@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+
+
+def parse_work_shard(text):
+    """解析 "K/N"（0 <= K < N），返回 (K, N)"""
+    try:
+        index, count = (int(part) for part in text.split('/'))
+    except ValueError:
+        raise ValueError(f"分片格式应为 K/N: {text}") from None
+    if count < 1 or not 0 <= index < count:
+        raise ValueError(f"分片编号超出范围: {text}")
+    return index, count
+
+
+def shard_range(total, index, count):
+    """第 index 个分片在全部 total 张图片中的范围 [start, end)
+
+    按连续区间均分，各分片张数最多相差一张。只依赖 total、index 和 count，
+    各节点独立计算得到的划分一致。
+    """
+    return total * index // count, total * (index + 1) // count
+
+
+def shard_tag(settings):
+    """分片标记（如 "part-00002-of-00008"），未分片时为空字符串"""
+    count = settings.get('work_shards', 1)
+    if count <= 1:
+        return ''
+    return f"part-{settings.get('work_shard', 0):05d}-of-{count:05d}"
+
+
+def tagged(filename, tag):
+    """在文件名的扩展名前插入分片标记"""
+    if not tag:
+        return filename
+    stem, ext = os.path.splitext(filename)
+    return f"{stem}.{tag}{ext}"
+
+
+def select_work_shard(images, settings):
+    """取出本节点负责的图片
+
+    images 为全部保留的图片（按扫描顺序），返回 (本分片的图片, 设置)。
+    设置中的起始序号加上分片的偏移，序号与不分片处理时一致。
+    """
+    count = settings.get('work_shards', 1)
+    if count <= 1:
+        return images, settings
+    start, end = shard_range(len(images), settings.get('work_shard', 0), count)
+    return images[start:end], dict(settings, start_number=settings['start_number'] + start)
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import heapq
+import itertools
+import os
+import threading
+
+
+class PriorityWorkerPool:
+    """带优先级的后台线程池
+
+    任务以 key 标识，priority 越小越先执行；对尚未执行的 key 重复提交会更新其优先级。
+    handler(key) 在工作线程中执行，完成后在同一线程调用 callback(key, result)（可选）。
+    """
+
+    def __init__(self, handler, callback=None, workers=None):
+        self.handler = handler
+        self.callback = callback
+        self._heap = []  # (priority, seq, key)
+        self._pending = {}  # key -> priority
+        self._active = 0  # 正在执行 handler 的任务数
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._stopped = False
+
+        workers = workers or min(8, os.cpu_count() or 1)
+        self._threads = [threading.Thread(target=self._run, daemon=True)
+                         for _ in range(workers)]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, key, priority=0):
+        """提交任务或更新未执行任务的优先级"""
+        with self._cond:
+            if self._pending.get(key) == priority:
+                return
+            self._pending[key] = priority
+            heapq.heappush(self._heap, (priority, next(self._seq), key))
+            self._cond.notify()
+
+    def cancel(self, key):
+        """取消尚未执行的任务"""
+        with self._cond:
+            self._pending.pop(key, None)
+
+    def clear(self):
+        """取消所有尚未执行的任务"""
+        with self._cond:
+            self._pending.clear()
+            self._heap.clear()
+
+    def pending(self):
+        """尚未执行的任务数"""
+        with self._cond:
+            return len(self._pending)
+
+    def unfinished(self):
+        """尚未执行和正在执行的任务数
+
+        handler 返回后、调用 callback 之前任务即计为完成，callback 中返回 0
+        说明这是最后一个完成的任务。
+        """
+        with self._cond:
+            return len(self._pending) + self._active
+
+    def shutdown(self, timeout=None):
+        """停止工作线程（正在执行的任务会执行完毕）"""
+        with self._cond:
+            self._stopped = True
+            self._pending.clear()
+            self._heap.clear()
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def _next_task(self):
+        """取出优先级最高的有效任务，线程池停止时返回 None"""
+        with self._cond:
+            while True:
+                while not self._heap and not self._stopped:
+                    self._cond.wait()
+                if self._stopped:
+                    return None
+
+                priority, _, key = heapq.heappop(self._heap)
+                # 跳过已取消或已更新优先级的旧条目
+                if self._pending.get(key) == priority:
+                    del self._pending[key]
+                    self._active += 1
+                    return key
+
+    def _run(self):
+        while True:
+            key = self._next_task()
+            if key is None:
+                return
+            try:
+                result = self.handler(key)
+            except Exception as e:
+                print(f"Error in background task {key}: {e}")
+                result = None
+            with self._cond:
+                self._active -= 1
+            if self.callback is not None:
+                self.callback(key, result)
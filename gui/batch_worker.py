@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from PyQt5.QtCore import QThread, pyqtSignal
+from core.batch_stats import ThroughputMeter
+import os
+import threading
+import time
+
+
+class BatchWorker(QThread):
+    """后台批量处理线程
+
+    在独立线程中运行批量处理并生成日志，界面保持响应，处理期间可以继续整理其他文件夹。
+    进度通过 progress 信号报告（最多每 PROGRESS_INTERVAL 秒一次），附带吞吐量和剩余时间。
+    cancel 立即通知处理器停止，已开始的图片完成并记入日志后结束；pause 在进度回调中阻塞，
+    暂停期间不再提交新的结果，流水线中的任务填满后也会停下。
+    """
+
+    progress = pyqtSignal(int, int, str)  # 已完成, 总数, 进度文本
+    batch_finished = pyqtSignal(int, int, bool)  # 成功数, 总数, 是否已取消
+    batch_failed = pyqtSignal(str)
+
+    PROGRESS_INTERVAL = 0.2
+
+    def __init__(self, processor, images, settings, parent=None):
+        super().__init__(parent)
+        self.processor = processor
+        self.images = images
+        self.settings = settings
+        self._running = threading.Event()
+        self._running.set()
+        self._cancelled = threading.Event()
+
+    def cancel(self):
+        """取消处理（暂停中也立即生效）"""
+        self._cancelled.set()
+        self.processor.cancel()
+        self._running.set()
+
+    def pause(self):
+        self._running.clear()
+
+    def resume(self):
+        self._running.set()
+
+    def is_paused(self):
+        return not self._running.is_set()
+
+    def is_cancelled(self):
+        return self._cancelled.is_set()
+
+    def run(self):
+        meter = ThroughputMeter(len(self.images))
+        counted = 0
+        bytes_done = 0
+        last_emit = 0.0
+
+        def on_progress(done, total):
+            nonlocal counted, bytes_done, last_emit
+            for path, _ in self.images[counted:done]:
+                try:
+                    bytes_done += os.path.getsize(path)
+                except OSError:
+                    pass
+            counted = done
+            meter.update(done, bytes_done)
+
+            now = time.monotonic()
+            if done == total or now - last_emit >= self.PROGRESS_INTERVAL:
+                last_emit = now
+                self.progress.emit(done, total, meter.describe())
+
+            if not self._running.is_set():
+                self._running.wait()
+                meter.resume()
+            return not self._cancelled.is_set()
+
+        try:
+            success_count = self.processor.process_batch(self.images, self.settings, on_progress)
+            self.processor.save_logs(self.settings['output_folder'])
+        except Exception as e:
+            self.batch_failed.emit(str(e))
+            return
+        self.batch_finished.emit(success_count, len(self.images), self._cancelled.is_set())
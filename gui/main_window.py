@@ -3,14 +3,23 @@
 
 from PyQt5.QtWidgets import (QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
                              QPushButton, QFileDialog, QMessageBox, QSplitter,
-                             QProgressDialog, QLabel)
+                             QProgressDialog, QProgressBar, QLabel, QApplication,
+                             QComboBox, QCheckBox, QSpinBox)
 from PyQt5.QtCore import Qt, QSettings
+from PyQt5.QtGui import QPixmap
+from gui.batch_worker import BatchWorker
+from gui.metadata_worker import MetadataWorker
 from gui.thumbnail_view import ThumbnailView
 from gui.preview_panel import PreviewPanel
 from gui.settings_panel import SettingsPanel
+from gui.thumbnail_loader import ThumbnailLoader
 from core.image_loader import ImageLoader
-from core.batch_processor import BatchProcessor
+from core.batch_processor import create_processor
+from core.curation_state import CurationState
+from core.dedupe import find_duplicates
+from core.preview_cache import PreviewCache
 from utils.config import Config
+from utils.logger import Logger
 import os
 
 
@@ -20,9 +29,14 @@ class MainWindow(QMainWindow):
     def __init__(self):
         super().__init__()
         self.image_loader = ImageLoader()
-        self.batch_processor = BatchProcessor()
+        self.batch_worker = None
+        self.metadata_worker = None
+        self.metadata = None  # ImageMetadata，后台索引完成前为 None
+        self.thumbnail_loader = ThumbnailLoader(self.image_loader)
+        self.thumbnail_loader.thumbnail_ready.connect(self.on_thumbnail_ready)
+        self.preview_cache = PreviewCache(self.image_loader)
         self.current_index = -1
-        self.images_data = []  # [{path, keep, rotation}, ...]
+        self.state = CurationState()
 
         self.init_ui()
         self.load_settings()
@@ -50,6 +64,42 @@ class MainWindow(QMainWindow):
         self.btn_output.clicked.connect(self.select_output_folder)
         toolbar_layout.addWidget(self.btn_output)
 
+        self.btn_dedupe = QPushButton("查找重复")
+        self.btn_dedupe.setToolTip("用感知哈希查找近似重复的图片，每组只保留第一张")
+        self.btn_dedupe.clicked.connect(self.find_duplicates)
+        self.btn_dedupe.setEnabled(False)
+        toolbar_layout.addWidget(self.btn_dedupe)
+
+        # 排序和筛选（只改变显示顺序，批量处理仍按扫描顺序编号）
+        toolbar_layout.addWidget(QLabel("排序:"))
+        self.combo_sort = QComboBox()
+        for text, key in (("文件名", 'name'), ("像素数", 'pixels'), ("宽度", 'width'),
+                          ("高度", 'height'), ("文件大小", 'size'), ("格式", 'format')):
+            self.combo_sort.addItem(text, key)
+        toolbar_layout.addWidget(self.combo_sort)
+
+        self.check_descending = QCheckBox("降序")
+        toolbar_layout.addWidget(self.check_descending)
+
+        toolbar_layout.addWidget(QLabel("格式:"))
+        self.combo_filter_format = QComboBox()
+        self.combo_filter_format.addItem("全部", None)
+        toolbar_layout.addWidget(self.combo_filter_format)
+
+        toolbar_layout.addWidget(QLabel("最短边 ≥"))
+        self.spin_min_side = QSpinBox()
+        self.spin_min_side.setRange(0, 100000)
+        self.spin_min_side.setSingleStep(64)
+        self.spin_min_side.setSuffix(" px")
+        self.spin_min_side.setSpecialValueText("不限")
+        toolbar_layout.addWidget(self.spin_min_side)
+
+        self.combo_sort.currentIndexChanged.connect(self.apply_view)
+        self.check_descending.toggled.connect(self.apply_view)
+        self.combo_filter_format.currentIndexChanged.connect(self.apply_view)
+        self.spin_min_side.editingFinished.connect(self.apply_view)
+        self.set_view_controls_enabled(False)
+
         toolbar_layout.addStretch()
 
         self.btn_process = QPushButton("开始批量处理")
@@ -73,8 +123,9 @@ class MainWindow(QMainWindow):
         splitter = QSplitter(Qt.Horizontal)
 
         # 左侧：缩略图视图
-        self.thumbnail_view = ThumbnailView()
+        self.thumbnail_view = ThumbnailView(self.cached_thumbnail)
         self.thumbnail_view.image_selected.connect(self.on_image_selected)
+        self.thumbnail_view.thumbnails_requested.connect(self.thumbnail_loader.request)
         splitter.addWidget(self.thumbnail_view)
 
         # 右侧：预览面板
@@ -91,7 +142,17 @@ class MainWindow(QMainWindow):
         self.settings_panel = SettingsPanel()
         main_layout.addWidget(self.settings_panel)
 
-        # 状态栏
+        # 状态栏：批量处理进度在后台运行时显示在右侧
+        self.label_batch = QLabel()
+        self.batch_progress = QProgressBar()
+        self.batch_progress.setMaximumWidth(200)
+        self.btn_pause = QPushButton("暂停")
+        self.btn_pause.clicked.connect(self.toggle_batch_pause)
+        self.btn_cancel = QPushButton("取消")
+        self.btn_cancel.clicked.connect(self.cancel_batch)
+        for widget in (self.label_batch, self.batch_progress, self.btn_pause, self.btn_cancel):
+            self.statusBar().addPermanentWidget(widget)
+        self.set_batch_widgets_visible(False)
         self.statusBar().showMessage("就绪")
 
     def select_input_folder(self):
@@ -115,57 +176,133 @@ class MainWindow(QMainWindow):
         """加载图片"""
         self.statusBar().showMessage("正在加载图片...")
 
-        # 加载图片列表
-        image_files = self.image_loader.scan_folder(folder)
+        # 流式扫描图片列表，扫描期间保持界面响应
+        image_files = []
+        self.btn_input.setEnabled(False)
+        try:
+            for batch in self.image_loader.iter_scan(folder):
+                image_files.extend(batch)
+                self.statusBar().showMessage(f"正在加载图片... 已发现 {len(image_files)} 张")
+                QApplication.processEvents()
+        finally:
+            self.btn_input.setEnabled(True)
+        image_files.sort()
 
         if not image_files:
             QMessageBox.warning(self, "警告", "未找到任何图片文件！")
             return
 
-        # 初始化图片数据
-        self.images_data = [
-            {'path': img, 'keep': True, 'rotation': 0}
-            for img in image_files
-        ]
-
-        # 生成缩略图
-        progress = QProgressDialog("正在生成缩略图...", "取消", 0, len(image_files), self)
-        progress.setWindowModality(Qt.WindowModal)
-
-        thumbnails = []
-        for i, img_path in enumerate(image_files):
-            if progress.wasCanceled():
-                break
-            thumb = self.image_loader.get_thumbnail(img_path)
-            thumbnails.append(thumb)
-            progress.setValue(i + 1)
+        # 初始化整理状态（恢复该文件夹上次的保留/旋转决定）
+        self.state.close()
+        self.state = CurationState.open_session(folder, image_files)
+        self.stop_metadata_worker()
+        self.metadata = None
+        self.set_view_controls_enabled(False)
 
-        progress.close()
+        self.preview_cache.clear()
 
-        # 更新缩略图视图
-        self.thumbnail_view.set_images(thumbnails, self.images_data)
+        # 缩略图在后台生成，先显示占位图
+        self.thumbnail_loader.set_paths(self.state.paths)
+        self.thumbnail_view.set_state(self.state)
 
         # 显示第一张
-        if self.images_data:
+        if len(self.state):
             self.current_index = 0
             self.show_current_image()
 
         self.update_status()
-        self.statusBar().showMessage(f"已加载 {len(image_files)} 张图片")
+        self.btn_dedupe.setEnabled(True)
+        scan = self.image_loader.last_scan
+        self.statusBar().showMessage(f"已加载 {len(self.state)} 张图片"
+                                     f"（新增 {len(scan.added)}，删除 {len(scan.removed)}）")
+
+        # 后台加载元数据索引（只读取新增或修改的图片的文件头）
+        self.metadata_worker = MetadataWorker(folder, self.state.paths, self)
+        self.metadata_worker.progress.connect(self.on_metadata_progress)
+        self.metadata_worker.metadata_ready.connect(self.on_metadata_ready)
+        self.metadata_worker.start()
+
+    def stop_metadata_worker(self):
+        """停止正在进行的元数据索引"""
+        if self.metadata_worker is not None:
+            self.metadata_worker.cancel()
+            self.metadata_worker.wait()
+            self.metadata_worker.deleteLater()
+            self.metadata_worker = None
+
+    def on_metadata_progress(self, done, total):
+        """元数据索引进度"""
+        self.statusBar().showMessage(f"正在建立元数据索引... {done}/{total}")
+
+    def on_metadata_ready(self, metadata):
+        """元数据索引完成，启用排序和筛选"""
+        if len(metadata) != len(self.state):
+            return
+        self.metadata = metadata
+
+        self.combo_filter_format.blockSignals(True)
+        self.combo_filter_format.clear()
+        self.combo_filter_format.addItem("全部", None)
+        for name in sorted(name for name in metadata.formats if name):
+            self.combo_filter_format.addItem(name, name)
+        self.combo_filter_format.blockSignals(False)
+
+        self.set_view_controls_enabled(True)
+        self.apply_view()
+        self.show_current_image()
+
+    def set_view_controls_enabled(self, enabled):
+        for widget in (self.combo_sort, self.check_descending,
+                       self.combo_filter_format, self.spin_min_side):
+            widget.setEnabled(enabled)
+
+    def apply_view(self):
+        """按当前排序和筛选条件更新缩略图的显示顺序"""
+        if self.metadata is None:
+            return
+        order = self.metadata.view_order(self.combo_sort.currentData(),
+                                         self.check_descending.isChecked(),
+                                         self.combo_filter_format.currentData(),
+                                         self.spin_min_side.value())
+        self.thumbnail_view.set_order(order)
+        self.statusBar().showMessage(
+            f"显示 {self.thumbnail_view.visible_count()}/{len(self.state)} 张图片")
+
+    def cached_thumbnail(self, index):
+        """返回内存中已有的缩略图，没有时返回 None"""
+        return self.image_loader.thumbnail_cache.get(self.state.path(index))
+
+    def on_thumbnail_ready(self, index, qimage):
+        """后台缩略图生成完成"""
+        if not 0 <= index < len(self.state):
+            return
+        pixmap = QPixmap.fromImage(qimage)
+        self.image_loader.thumbnail_cache.put(self.state.path(index), pixmap)
+        self.thumbnail_view.set_thumbnail(index)
 
     def show_current_image(self):
         """显示当前图片"""
-        if 0 <= self.current_index < len(self.images_data):
-            data = self.images_data[self.current_index]
-            image = self.image_loader.load_image(data['path'])
+        if 0 <= self.current_index < len(self.state):
+            path = self.state.path(self.current_index)
+            image, source_size = self.preview_cache.get(path)
+            model = self.thumbnail_view.model
+            row = model.row_of(self.current_index)
+            if row >= 0:
+                # 按显示顺序预取前后的图片
+                self.preview_cache.prefetch_around(
+                    row, model.rowCount(), lambda r: self.state.path(model.index_at(r)))
+            if image is None:
+                return
 
             self.preview_panel.set_image(
                 image,
-                data['path'],
-                data['keep'],
-                data['rotation'],
+                path,
+                self.state.is_kept(self.current_index),
+                self.state.get_rotation(self.current_index),
                 self.current_index,
-                len(self.images_data)
+                len(self.state),
+                source_size,
+                self.metadata.get(self.current_index) if self.metadata is not None else None
             )
 
             self.thumbnail_view.set_current_index(self.current_index)
@@ -177,35 +314,66 @@ class MainWindow(QMainWindow):
 
     def on_keep_changed(self, keep):
         """保留状态改变"""
-        if 0 <= self.current_index < len(self.images_data):
-            self.images_data[self.current_index]['keep'] = keep
+        if 0 <= self.current_index < len(self.state):
+            self.state.set_keep(self.current_index, keep)
             self.thumbnail_view.update_keep_status(self.current_index, keep)
             self.update_status()
 
     def on_rotation_changed(self, rotation):
         """旋转角度改变"""
-        if 0 <= self.current_index < len(self.images_data):
-            self.images_data[self.current_index]['rotation'] = rotation
+        if 0 <= self.current_index < len(self.state):
+            self.state.set_rotation(self.current_index, rotation)
+
+    def find_duplicates(self):
+        """查找近似重复的图片，每组除第一张外标记为跳过"""
+        progress = QProgressDialog("正在查找重复图片...", "取消", 0, len(self.state), self)
+        progress.setWindowModality(Qt.WindowModal)
+
+        def on_progress(done, total):
+            progress.setValue(done)
+            return not progress.wasCanceled()
+
+        try:
+            groups = find_duplicates(self.image_loader, self.state.paths,
+                                     progress_callback=on_progress)
+        except ImportError as e:
+            QMessageBox.warning(self, "警告", str(e))
+            return
+        finally:
+            progress.close()
+        if groups is None:
+            return
+
+        skipped = 0
+        for group in groups:
+            for index in group[1:]:
+                if self.state.is_kept(index):
+                    self.state.set_keep(index, False)
+                    self.thumbnail_view.update_keep_status(index, False)
+                    skipped += 1
+
+        self.update_status()
+        self.show_current_image()
+        self.statusBar().showMessage(f"找到 {len(groups)} 组重复图片，新标记跳过 {skipped} 张")
 
     def navigate_image(self, direction):
         """导航图片"""
-        if direction == 'prev' and self.current_index > 0:
-            self.current_index -= 1
-            self.show_current_image()
-        elif direction == 'next' and self.current_index < len(self.images_data) - 1:
-            self.current_index += 1
+        index = self.thumbnail_view.neighbor(self.current_index,
+                                             -1 if direction == 'prev' else 1)
+        if index >= 0:
+            self.current_index = index
             self.show_current_image()
 
     def update_status(self):
         """更新状态"""
-        keep_count = sum(1 for img in self.images_data if img['keep'])
-        self.settings_panel.update_stats(keep_count, len(self.images_data))
+        self.settings_panel.update_stats(self.state.keep_count, len(self.state))
 
     def check_ready_to_process(self):
         """检查是否可以开始处理"""
         ready = (bool(self.settings_panel.input_folder) and
                  bool(self.settings_panel.output_folder) and
-                 len(self.images_data) > 0)
+                 len(self.state) > 0 and
+                 self.batch_worker is None)
         self.btn_process.setEnabled(ready)
 
     def start_batch_process(self):
@@ -214,7 +382,7 @@ class MainWindow(QMainWindow):
         settings = self.settings_panel.get_settings()
 
         # 过滤保留的图片
-        images_to_process = [img for img in self.images_data if img['keep']]
+        images_to_process = self.state.kept()
 
         if not images_to_process:
             QMessageBox.warning(self, "警告", "没有标记为保留的图片！")
@@ -231,48 +399,87 @@ class MainWindow(QMainWindow):
         if reply == QMessageBox.No:
             return
 
-        # 进度对话框
-        progress = QProgressDialog("正在处理图片...", "取消", 0, len(images_to_process), self)
-        progress.setWindowModality(Qt.WindowModal)
-
-        # 批量处理
-        success_count = 0
-        for i, img_data in enumerate(images_to_process):
-            if progress.wasCanceled():
-                break
-
-            success = self.batch_processor.process_image(
-                img_data['path'],
-                settings['output_folder'],
-                settings['prefix'],
-                settings['start_number'] + i,
-                settings['padding'],
-                settings['scale_percent'],
-                img_data['rotation'],
-                settings['output_format'],
-                settings['quality']
-            )
-
-            if success:
-                success_count += 1
-
-            progress.setValue(i + 1)
-
-        progress.close()
-
-        # 生成日志
-        self.batch_processor.save_logs(settings['output_folder'])
+        # 在后台线程中批量处理，进度显示在状态栏
+        if settings['profile']:
+            Logger.setup()
+        self.batch_worker = BatchWorker(create_processor(settings), images_to_process,
+                                        settings, self)
+        self.batch_worker.progress.connect(self.on_batch_progress)
+        self.batch_worker.batch_finished.connect(self.on_batch_finished)
+        self.batch_worker.batch_failed.connect(self.on_batch_failed)
+
+        self.batch_progress.setRange(0, len(images_to_process))
+        self.batch_progress.setValue(0)
+        self.label_batch.setText("批量处理: 正在启动...")
+        self.btn_pause.setText("暂停")
+        self.btn_cancel.setEnabled(True)
+        self.set_batch_widgets_visible(True)
+        self.check_ready_to_process()
+        self.batch_worker.start()
+
+    def set_batch_widgets_visible(self, visible):
+        for widget in (self.label_batch, self.batch_progress, self.btn_pause, self.btn_cancel):
+            widget.setVisible(visible)
+
+    def on_batch_progress(self, done, total, text):
+        """后台处理进度"""
+        self.batch_progress.setValue(done)
+        if self.batch_worker.is_cancelled():
+            return
+        suffix = "（已暂停）" if self.batch_worker.is_paused() else ""
+        self.label_batch.setText(f"批量处理: {text}{suffix}")
+
+    def toggle_batch_pause(self):
+        """暂停/继续批量处理"""
+        if self.batch_worker.is_paused():
+            self.batch_worker.resume()
+            self.btn_pause.setText("暂停")
+            self.label_batch.setText(self.label_batch.text().replace("（已暂停）", ""))
+        else:
+            self.batch_worker.pause()
+            self.btn_pause.setText("继续")
+            self.label_batch.setText(self.label_batch.text() + "（已暂停）")
+
+    def cancel_batch(self):
+        """取消批量处理，已开始的图片完成后结束"""
+        self.batch_worker.cancel()
+        self.btn_cancel.setEnabled(False)
+        self.btn_pause.setEnabled(False)
+        self.label_batch.setText("批量处理: 正在取消...")
+
+    def finish_batch(self):
+        """后台处理结束后恢复界面"""
+        self.batch_worker.wait()
+        self.batch_worker.deleteLater()
+        self.batch_worker = None
+        self.btn_pause.setEnabled(True)
+        self.set_batch_widgets_visible(False)
+        self.check_ready_to_process()
+
+    def on_batch_finished(self, success_count, total, cancelled):
+        """批量处理完成"""
+        settings = self.batch_worker.settings
+        self.finish_batch()
+
+        if cancelled:
+            self.statusBar().showMessage(f"已取消: 成功处理 {success_count}/{total} 张图片")
+            return
 
-        # 完成提示
+        self.statusBar().showMessage(f"处理完成:  {success_count}/{total} 张图片")
         QMessageBox.information(
             self,
             "处理完成",
-            f"成功处理 {success_count}/{len(images_to_process)} 张图片！\n\n"
+            f"成功处理 {success_count}/{total} 张图片！\n\n"
             f"输出路径: {settings['output_folder']}\n"
             f"日志文件: processed_log.txt, skipped_files.txt"
+            + (", processing_stats.json" if settings['profile'] else "")
         )
 
-        self.statusBar().showMessage(f"处理完成:  {success_count}/{len(images_to_process)} 张图片")
+    def on_batch_failed(self, message):
+        """批量处理出错"""
+        self.finish_batch()
+        self.statusBar().showMessage("批量处理出错")
+        QMessageBox.critical(self, "处理出错", f"批量处理出错：{message}")
 
     def load_settings(self):
         """加载设置"""
@@ -286,5 +493,19 @@ class MainWindow(QMainWindow):
 
     def closeEvent(self, event):
         """关闭事件"""
+        if self.batch_worker is not None:
+            reply = QMessageBox.question(
+                self, "正在处理", "批量处理尚未完成，是否取消并退出？",
+                QMessageBox.Yes | QMessageBox.No)
+            if reply == QMessageBox.No:
+                event.ignore()
+                return
+            self.batch_worker.cancel()
+            self.batch_worker.wait()
+        self.stop_metadata_worker()
         self.save_settings()
+        self.thumbnail_loader.shutdown()
+        self.preview_cache.shutdown()
+        self.image_loader.flush()
+        self.state.close()
         event.accept()
\ No newline at end of file
@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from PyQt5.QtCore import QThread, pyqtSignal
+from core.metadata_index import MetadataIndex
+import sqlite3
+
+
+class MetadataWorker(QThread):
+    """后台加载/更新图片元数据索引
+
+    需要读取文件头的图片较多时通过 progress 报告进度，完成后通过 metadata_ready
+    发出 ImageMetadata；cancel 后不再发出结果。
+    """
+
+    progress = pyqtSignal(int, int)
+    metadata_ready = pyqtSignal(object)
+
+    def __init__(self, root, paths, parent=None):
+        super().__init__(parent)
+        self.root = root
+        self.paths = paths
+        self._cancelled = False
+
+    def cancel(self):
+        self._cancelled = True
+
+    def run(self):
+        def on_progress(done, total):
+            self.progress.emit(done, total)
+            return not self._cancelled
+
+        try:
+            metadata = MetadataIndex(self.root).build(self.paths, on_progress)
+        except (OSError, sqlite3.Error, UnicodeError) as e:
+            print(f"Error building metadata index: {e}")
+            return
+        if metadata is not None and not self._cancelled:
+            self.metadata_ready.emit(metadata)
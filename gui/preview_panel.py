@@ -5,6 +5,10 @@ from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QLabel,
                              QPushButton, QCheckBox, QGroupBox)
 from PyQt5.QtCore import Qt, pyqtSignal
 from PyQt5.QtGui import QPixmap, QImage
+from PIL import Image
+from core.image_loader import ImageLoader
+from core.image_processor import ImageProcessor
+from utils.lru_cache import LRUCache
 import os
 
 
@@ -15,10 +19,16 @@ class PreviewPanel(QWidget):
     rotation_changed = pyqtSignal(int)
     navigate = pyqtSignal(str)
 
+    PIXMAP_CACHE_BYTES = 64 * 1024 * 1024
+
     def __init__(self):
         super().__init__()
         self.current_image = None
+        self.current_path = None
         self.current_rotation = 0
+        # (路径, 图片尺寸, 旋转, 显示宽, 显示高) -> QPixmap
+        self.pixmap_cache = LRUCache(self.PIXMAP_CACHE_BYTES, ImageLoader.pixmap_bytes)
+        self._base = (None, None)  # (键, 缩小到显示尺寸的未旋转图片)
         self.init_ui()
 
     def init_ui(self):
@@ -73,21 +83,35 @@ class PreviewPanel(QWidget):
 
         layout.addLayout(control_layout)
 
-    def set_image(self, image, path, keep, rotation, index, total):
-        """设置图片"""
+    def set_image(self, image, path, keep, rotation, index, total, source_size=None,
+                  metadata=None):
+        """设置图片
+
+        image 可以是降低分辨率的预览图，source_size 为原图尺寸。
+        metadata 为元数据索引中的记录（见 ImageMetadata.get），有记录时不再读取文件大小。
+        """
         self.current_image = image
+        self.current_path = path
         self.current_rotation = rotation
 
         # 更新信息
         filename = os.path.basename(path)
-        width, height = image.size
-        file_size = os.path.getsize(path) / (1024 * 1024)  # MB
+        if metadata is not None and metadata['width']:
+            width, height = metadata['width'], metadata['height']
+            file_size = metadata['size'] / (1024 * 1024)  # MB
+        else:
+            width, height = source_size or image.size
+            file_size = os.path.getsize(path) / (1024 * 1024)  # MB
 
         info_text = (f"<b>文件: </b> {filename} | "
                      f"<b>分辨率:</b> {width}x{height} | "
-                     f"<b>大小:</b> {file_size:.2f} MB | "
-                     f"<b>旋转:</b> {rotation}° | "
-                     f"<b>进度:</b> {index + 1}/{total}")
+                     f"<b>大小:</b> {file_size:.2f} MB | ")
+        if metadata is not None and metadata['format']:
+            info_text += f"<b>格式:</b> {metadata['format']} {metadata['mode']} | "
+            if metadata['orientation'] > 1:
+                info_text += f"<b>EXIF 方向:</b> {metadata['orientation']} | "
+        info_text += (f"<b>旋转:</b> {rotation}° | "
+                      f"<b>进度:</b> {index + 1}/{total}")
         self.label_info.setText(info_text)
 
         # 更新复选框
@@ -103,22 +127,42 @@ class PreviewPanel(QWidget):
         if self.current_image is None:
             return
 
-        # 应用旋转
-        image = self.current_image.rotate(-self.current_rotation, expand=True)
-
-        # 转换为QPixmap
-        img_data = image.tobytes("raw", "RGB")
-        qimage = QImage(img_data, image.width, image.height, QImage.Format_RGB888)
-        pixmap = QPixmap.fromImage(qimage)
-
-        # 缩放以适应显示区域
-        scaled_pixmap = pixmap.scaled(
-            self.image_label.size(),
-            Qt.KeepAspectRatio,
-            Qt.SmoothTransformation
-        )
-
-        self.image_label.setPixmap(scaled_pixmap)
+        width, height = self.image_label.width(), self.image_label.height()
+        key = (self.current_path, self.current_image.size, self.current_rotation, width, height)
+
+        pixmap = self.pixmap_cache.get(key)
+        if pixmap is None:
+            image = self.render_image(width, height)
+            pixmap = QPixmap.fromImage(ImageLoader.to_qimage(image))
+            self.pixmap_cache.put(key, pixmap)
+
+        self.image_label.setPixmap(pixmap)
+
+    def render_image(self, width, height):
+        """先缩放到显示尺寸，再旋转（90° 的倍数使用无损转置）"""
+        rotation = self.current_rotation
+
+        # 缩小到能容纳两种方向的尺寸并缓存，旋转时不再处理原图
+        side = max(width, height)
+        base_key = (self.current_path, self.current_image.size, side)
+        if self._base[0] != base_key:
+            base = self.current_image
+            if base.width > side or base.height > side:
+                base = base.copy()
+                base.thumbnail((side, side), Image.Resampling.LANCZOS, reducing_gap=2.0)
+            self._base = (base_key, base)
+        image = self._base[1]
+
+        # 缩放以适应显示区域（旋转 90°/270° 时宽高互换）
+        if rotation in (90, 270):
+            width, height = height, width
+        scale = min(width / image.width, height / image.height)
+        target = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+        if target != image.size:
+            image = image.resize(target, Image.Resampling.LANCZOS, reducing_gap=2.0)
+
+        # 应用旋转（与批量处理使用相同的转置）
+        return ImageProcessor.rotate_image(image, rotation)
 
     def rotate_image(self, angle):
         """旋转图片"""
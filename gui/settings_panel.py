@@ -3,8 +3,9 @@
 
 from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QLabel,
                              QLineEdit, QSpinBox, QDoubleSpinBox, QComboBox,
-                             QGroupBox, QSlider)
+                             QGroupBox, QSlider, QCheckBox)
 from PyQt5.QtCore import Qt
+import os
 
 
 class SettingsPanel(QWidget):
@@ -24,13 +25,51 @@ class SettingsPanel(QWidget):
         scale_group = QGroupBox("缩放设置")
         scale_layout = QHBoxLayout()
 
-        scale_layout.addWidget(QLabel("等比例缩放:"))
-        self.spin_scale = QSpinBox()
-        self.spin_scale.setRange(1, 100)
+        self.combo_resize_mode = QComboBox()
+        self.combo_resize_mode.addItem("等比例缩放", 'percent')
+        self.combo_resize_mode.addItem("最长边", 'max_side')
+        self.combo_resize_mode.addItem("最短边", 'short_side')
+        self.combo_resize_mode.addItem("指定尺寸", 'exact')
+        self.combo_resize_mode.currentIndexChanged.connect(self.update_resize_inputs)
+        scale_layout.addWidget(self.combo_resize_mode)
+
+        self.spin_scale = QDoubleSpinBox()
+        self.spin_scale.setRange(0.1, 100)
+        self.spin_scale.setDecimals(1)
         self.spin_scale.setValue(50)
         self.spin_scale.setSuffix(" %")
         scale_layout.addWidget(self.spin_scale)
 
+        self.spin_target_size = QSpinBox()
+        self.spin_target_size.setRange(1, 65535)
+        self.spin_target_size.setValue(512)
+        self.spin_target_size.setSuffix(" px")
+        scale_layout.addWidget(self.spin_target_size)
+
+        self.spin_target_width = QSpinBox()
+        self.spin_target_width.setRange(1, 65535)
+        self.spin_target_width.setValue(512)
+        scale_layout.addWidget(self.spin_target_width)
+
+        self.label_times = QLabel("×")
+        scale_layout.addWidget(self.label_times)
+
+        self.spin_target_height = QSpinBox()
+        self.spin_target_height.setRange(1, 65535)
+        self.spin_target_height.setValue(512)
+        scale_layout.addWidget(self.spin_target_height)
+
+        scale_layout.addWidget(QLabel("重采样:"))
+        self.combo_resample = QComboBox()
+        self.combo_resample.addItem("快速", 'fast')
+        self.combo_resample.addItem("均衡", 'balanced')
+        self.combo_resample.addItem("最佳", 'best')
+        self.combo_resample.setCurrentIndex(1)
+        self.combo_resample.setToolTip("快速/均衡：先按整数倍缩小（JPEG 直接以较低分辨率解码）再精确重采样，"
+                                       "大幅缩小时速度快数倍；最佳：从原图 LANCZOS 重采样")
+        scale_layout.addWidget(self.combo_resample)
+        self.update_resize_inputs()
+
         scale_group.setLayout(scale_layout)
         layout.addWidget(scale_group)
 
@@ -40,8 +79,9 @@ class SettingsPanel(QWidget):
 
         format_layout.addWidget(QLabel("格式:"))
         self.combo_format = QComboBox()
-        self.combo_format.addItems(["PNG", "JPG", "JPEG"])
+        self.combo_format.addItems(["PNG", "JPG", "JPEG", "WEBP"])
         self.combo_format.setCurrentText("PNG")
+        self.combo_format.currentIndexChanged.connect(self.update_format_inputs)
         format_layout.addWidget(self.combo_format)
 
         format_layout.addWidget(QLabel("质量:"))
@@ -50,6 +90,22 @@ class SettingsPanel(QWidget):
         self.spin_quality.setValue(95)
         format_layout.addWidget(self.spin_quality)
 
+        self.check_lossless = QCheckBox("无损")
+        self.check_lossless.setToolTip("WebP 无损压缩")
+        self.check_lossless.toggled.connect(self.update_format_inputs)
+        format_layout.addWidget(self.check_lossless)
+
+        format_layout.addWidget(QLabel("编码:"))
+        self.combo_encoder = QComboBox()
+        self.combo_encoder.addItem("最快", 'fastest')
+        self.combo_encoder.addItem("均衡", 'balanced')
+        self.combo_encoder.addItem("最小", 'smallest')
+        self.combo_encoder.setCurrentIndex(1)
+        self.combo_encoder.setToolTip("最快：编码速度优先，文件较大；均衡：JPEG 保留全部色度（4:4:4）；"
+                                      "最小：文件最小，编码较慢")
+        format_layout.addWidget(self.combo_encoder)
+        self.update_format_inputs()
+
         format_group.setLayout(format_layout)
         layout.addWidget(format_group)
 
@@ -77,6 +133,64 @@ class SettingsPanel(QWidget):
         naming_group.setLayout(naming_layout)
         layout.addWidget(naming_group)
 
+        # 输出方式
+        sink_group = QGroupBox("输出方式")
+        sink_layout = QHBoxLayout()
+
+        self.combo_sink = QComboBox()
+        self.combo_sink.addItem("单独文件", 'files')
+        self.combo_sink.addItem("分片归档 (tar)", 'shards')
+        self.combo_sink.setToolTip("分片归档将图片打包为大小有限的 tar 分片，并为每个分片生成索引")
+        sink_layout.addWidget(self.combo_sink)
+
+        sink_layout.addWidget(QLabel("分片大小:"))
+        self.spin_shard_size = QSpinBox()
+        self.spin_shard_size.setRange(1, 65536)
+        self.spin_shard_size.setValue(1024)
+        self.spin_shard_size.setSuffix(" MB")
+        self.spin_shard_size.setEnabled(False)
+        sink_layout.addWidget(self.spin_shard_size)
+
+        self.combo_sink.currentIndexChanged.connect(
+            lambda: self.spin_shard_size.setEnabled(self.combo_sink.currentData() == 'shards'))
+
+        sink_group.setLayout(sink_layout)
+        layout.addWidget(sink_group)
+
+        # 性能设置
+        perf_group = QGroupBox("性能")
+        perf_layout = QHBoxLayout()
+
+        perf_layout.addWidget(QLabel("并行进程:"))
+        self.spin_workers = QSpinBox()
+        self.spin_workers.setRange(1, 256)
+        self.spin_workers.setValue(os.cpu_count() or 1)
+        perf_layout.addWidget(self.spin_workers)
+
+        self.check_streaming = QCheckBox("流水线读写")
+        self.check_streaming.setToolTip("预读源文件、异步写出结果，与解码和编码重叠（适合网络存储）")
+        perf_layout.addWidget(self.check_streaming)
+
+        perf_layout.addWidget(QLabel("I/O 线程:"))
+        self.spin_io_threads = QSpinBox()
+        self.spin_io_threads.setRange(1, 64)
+        self.spin_io_threads.setValue(4)
+        self.spin_io_threads.setEnabled(False)
+        perf_layout.addWidget(self.spin_io_threads)
+        self.check_streaming.toggled.connect(self.spin_io_threads.setEnabled)
+
+        self.check_resume = QCheckBox("跳过已完成")
+        self.check_resume.setToolTip("输入和设置未变化且输出仍存在的图片不再重新处理")
+        self.check_resume.setChecked(True)
+        perf_layout.addWidget(self.check_resume)
+
+        self.check_profile = QCheckBox("耗时统计")
+        self.check_profile.setToolTip("记录各处理阶段的耗时，保存到 processing_stats.json")
+        perf_layout.addWidget(self.check_profile)
+
+        perf_group.setLayout(perf_layout)
+        layout.addWidget(perf_group)
+
         # 统计信息
         stats_group = QGroupBox("统计")
         stats_layout = QVBoxLayout()
@@ -95,14 +209,48 @@ class SettingsPanel(QWidget):
         return {
             'input_folder': self.input_folder,
             'output_folder': self.output_folder,
-            'scale_percent': self.spin_scale.value(),
+            'resize_mode': self.combo_resize_mode.currentData(),
+            'scale_percent': _plain_number(self.spin_scale.value()),
+            'target_size': self.spin_target_size.value(),
+            'target_width': self.spin_target_width.value(),
+            'target_height': self.spin_target_height.value(),
+            'resample': self.combo_resample.currentData(),
             'output_format': self.combo_format.currentText().lower(),
             'quality': self.spin_quality.value(),
+            'encoder_profile': self.combo_encoder.currentData(),
+            'lossless': self.check_lossless.isChecked(),
             'prefix': self.edit_prefix.text(),
             'start_number': self.spin_start.value(),
-            'padding': self.spin_padding.value()
+            'padding': self.spin_padding.value(),
+            'output_sink': self.combo_sink.currentData(),
+            'shard_size_mb': self.spin_shard_size.value(),
+            'workers': self.spin_workers.value(),
+            'streaming': self.check_streaming.isChecked(),
+            'io_threads': self.spin_io_threads.value(),
+            'resume': self.check_resume.isChecked(),
+            'profile': self.check_profile.isChecked()
         }
 
+    def update_format_inputs(self):
+        """质量只用于有损格式，无损选项只用于 WebP"""
+        format = self.combo_format.currentText()
+        self.check_lossless.setEnabled(format == "WEBP")
+        self.spin_quality.setEnabled(format in ("JPG", "JPEG")
+                                     or format == "WEBP" and not self.check_lossless.isChecked())
+
+    def update_resize_inputs(self):
+        """只显示当前缩放方式需要的输入框"""
+        mode = self.combo_resize_mode.currentData()
+        self.spin_scale.setVisible(mode == 'percent')
+        self.spin_target_size.setVisible(mode in ('max_side', 'short_side'))
+        for widget in (self.spin_target_width, self.label_times, self.spin_target_height):
+            widget.setVisible(mode == 'exact')
+
     def update_stats(self, keep_count, total):
         """更新统计"""
-        self.label_stats.setText(f"已标记保留: {keep_count} / {total}")
\ No newline at end of file
+        self.label_stats.setText(f"已标记保留: {keep_count} / {total}")
+
+
+def _plain_number(value):
+    """整数值的浮点数转为 int（保持日志和设置哈希与整数百分比一致）"""
+    return int(value) if float(value).is_integer() else value
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from PyQt5.QtCore import QObject, pyqtSignal
+from PyQt5.QtGui import QImage
+from core.image_loader import ImageLoader
+from core.worker_pool import PriorityWorkerPool
+
+
+class ThumbnailLoader(QObject):
+    """后台缩略图生成器
+
+    通过 request 请求的缩略图（可见单元格）优先生成，完成后通过 thumbnail_ready
+    信号在界面线程中通知；其余图片在后台依次生成，只写入持久化缓存，不占用界面内存。
+    后请求的批次先执行，快速滚动时总是优先生成当前可见的单元格。
+    """
+
+    thumbnail_ready = pyqtSignal(int, QImage)
+
+    # 优先级：可见项始终排在后台填充之前
+    PRIORITY_VISIBLE = 0
+    PRIORITY_BACKGROUND = 1
+
+    def __init__(self, image_loader, workers=None):
+        super().__init__()
+        self.image_loader = image_loader
+        self._state = (0, [])  # (generation, paths)，整体替换以便工作线程读取
+        self._requested = set()
+        self._request_seq = 0
+        self.pool = PriorityWorkerPool(self._load, self._on_loaded, workers)
+
+    def set_paths(self, paths):
+        """切换到新的图片列表，取消之前未完成的任务
+
+        paths 为可按索引访问的序列（如 PathTable），之后不应再修改。
+        """
+        self.pool.clear()
+        generation = self._state[0] + 1
+        self._state = (generation, paths)
+        self._requested = set()
+        for i in range(len(paths)):
+            self.pool.submit((generation, i), (self.PRIORITY_BACKGROUND, 0, i))
+
+    def request(self, indices):
+        """优先生成指定索引的缩略图"""
+        generation, paths = self._state
+        self._request_seq += 1
+        for i in indices:
+            if 0 <= i < len(paths):
+                self._requested.add((generation, i))
+                self.pool.submit((generation, i), (self.PRIORITY_VISIBLE, -self._request_seq, i))
+
+    def pending(self):
+        """尚未生成的缩略图数量"""
+        return self.pool.pending()
+
+    def shutdown(self):
+        """停止后台线程"""
+        self.pool.clear()
+        self.pool.shutdown(timeout=1.0)
+
+    def _load(self, key):
+        """工作线程：生成缩略图并转换为 QImage"""
+        generation, index = key
+        current_generation, paths = self._state
+        if generation != current_generation:
+            return None
+        image = self.image_loader.get_thumbnail_image(paths[index])
+
+        # 后台填充只写入持久化缓存
+        if key not in self._requested:
+            return None
+        self._requested.discard(key)
+        return ImageLoader.to_qimage(image)
+
+    def _on_loaded(self, key, qimage):
+        """工作线程：转发结果到界面线程"""
+        generation, index = key
+        if qimage is not None and generation == self._state[0]:
+            self.thumbnail_ready.emit(index, qimage)
+
+        # 最后一个任务完成后写入持久化缓存（包括其他线程中正在执行的任务）
+        if self.pool.unfinished() == 0:
+            self.image_loader.flush()
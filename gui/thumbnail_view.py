@@ -1,79 +1,197 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QScrollArea, QGridLayout,
-                             QLabel, QPushButton, QFrame)
-from PyQt5.QtCore import Qt, pyqtSignal, QSize
-from PyQt5.QtGui import QPixmap, QImage
+from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QLabel, QListView,
+                             QStyledItemDelegate, QStyle, QAbstractItemView)
+from PyQt5.QtCore import (Qt, pyqtSignal, QSize, QRect, QTimer,
+                          QAbstractListModel, QModelIndex)
+from PyQt5.QtGui import QPixmap, QColor, QPen
+from core.curation_state import CurationState
+from array import array
+import os
 
 
-class ThumbnailWidget(QFrame):
-    """单个缩略图部件"""
+class ThumbnailModel(QAbstractListModel):
+    """缩略图数据模型
 
-    clicked = pyqtSignal(int)
+    路径和保留/跳过状态直接读取 CurationState；缩略图通过 pixmap_provider(index) 按需获取，
+    未生成时显示占位图，并在本轮绘制结束后通过 thumbnails_requested 批量请求。
+    行与图片索引默认一一对应；set_order 设置排序/筛选后的显示顺序，
+    对外（信号、更新通知）始终使用图片索引。
+    """
 
-    def __init__(self, index, pixmap, filename, keep=True):
+    KeepRole = Qt.UserRole + 1
+
+    thumbnails_requested = pyqtSignal(list)
+
+    def __init__(self, pixmap_provider=None):
         super().__init__()
-        self.index = index
-        self.keep = keep
-        self.is_selected = False
+        self.state = CurationState()
+        self.order = None  # 行 -> 图片索引，None 表示按扫描顺序显示全部
+        self.rows = None  # 图片索引 -> 行，未显示的为 -1
+        self.pixmap_provider = pixmap_provider
+        self.placeholder = QPixmap(160, 160)
+        self.placeholder.fill(QColor("#e0e0e0"))
 
-        self.setFrameShape(QFrame.Box)
-        self.setLineWidth(2)
-        self.setFixedSize(180, 180)
+        self._requested = []
+        self._request_timer = QTimer(self)
+        self._request_timer.setSingleShot(True)
+        self._request_timer.setInterval(0)
+        self._request_timer.timeout.connect(self._flush_requests)
 
-        layout = QVBoxLayout(self)
-        layout.setContentsMargins(5, 5, 5, 5)
-
-        # 缩略图
-        self.img_label = QLabel()
-        self.img_label.setFixedSize(160, 140)
-        self.img_label.setScaledContents(True)
-        self.img_label.setPixmap(pixmap)
-        self.img_label.setAlignment(Qt.AlignCenter)
-        layout.addWidget(self.img_label)
-
-        # 文件名和状态
-        self.status_label = QLabel()
-        self.status_label.setAlignment(Qt.AlignCenter)
-        self.status_label.setWordWrap(True)
-        layout.addWidget(self.status_label)
-
-        self.update_display(filename, keep)
-
-    def update_display(self, filename, keep):
-        """更新显示"""
-        self.keep = keep
-        status = "✓ 保留" if keep else "✗ 跳过"
-        color = "green" if keep else "red"
-        self.status_label.setText(
-            f'<span style="color:{color}; font-weight:bold;">{status}</span><br>{filename[: 15]}...')
-
-    def set_selected(self, selected):
-        """设置选中状态"""
-        self.is_selected = selected
-        if selected:
-            self.setStyleSheet("ThumbnailWidget { border: 3px solid #2196F3; background-color: #E3F2FD; }")
+    def set_state(self, state):
+        """设置图片列表及整理状态"""
+        self.beginResetModel()
+        self.state = state
+        self.order = None
+        self.rows = None
+        self._requested = []
+        self.endResetModel()
+
+    def set_order(self, order):
+        """设置显示顺序（图片索引序列），None 表示按扫描顺序显示全部"""
+        self.beginResetModel()
+        self.order = order
+        if order is None:
+            self.rows = None
+        else:
+            self.rows = array('i', [-1]) * len(self.state)
+            for row, index in enumerate(order):
+                self.rows[index] = row
+        self._requested = []
+        self.endResetModel()
+
+    def index_at(self, row):
+        """行对应的图片索引"""
+        return row if self.order is None else self.order[row]
+
+    def row_of(self, index):
+        """图片索引对应的行，未显示时返回 -1"""
+        if not 0 <= index < len(self.state):
+            return -1
+        return index if self.rows is None else self.rows[index]
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.state) if self.order is None else len(self.order)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        image_index = self.index_at(index.row())
+
+        if role == Qt.DisplayRole:
+            return os.path.basename(self.state.path(image_index))
+        if role == Qt.ToolTipRole:
+            return self.state.path(image_index)
+        if role == self.KeepRole:
+            return self.state.is_kept(image_index)
+        if role == Qt.DecorationRole:
+            pixmap = self.pixmap_provider(image_index) if self.pixmap_provider else None
+            if pixmap is None:
+                self._request(image_index)
+                return self.placeholder
+            return pixmap
+        return None
+
+    def thumbnail_updated(self, image_index):
+        """缩略图已生成"""
+        row = self.row_of(image_index)
+        if row >= 0:
+            index = self.index(row)
+            self.dataChanged.emit(index, index, [Qt.DecorationRole])
+
+    def keep_updated(self, image_index):
+        """保留状态已改变"""
+        row = self.row_of(image_index)
+        if row >= 0:
+            index = self.index(row)
+            self.dataChanged.emit(index, index, [self.KeepRole])
+
+    def _request(self, image_index):
+        """记录需要生成的缩略图，合并到一次请求中"""
+        self._requested.append(image_index)
+        if not self._request_timer.isActive():
+            self._request_timer.start()
+
+    def _flush_requests(self):
+        indices, self._requested = self._requested, []
+        if indices:
+            self.thumbnails_requested.emit(sorted(set(indices)))
+
+
+class ThumbnailDelegate(QStyledItemDelegate):
+    """绘制单个缩略图单元格"""
+
+    CELL_SIZE = QSize(180, 180)
+    IMAGE_RECT = QRect(10, 5, 160, 140)
+
+    def sizeHint(self, option, index):
+        return self.CELL_SIZE
+
+    def paint(self, painter, option, index):
+        painter.save()
+        rect = option.rect.adjusted(2, 2, -2, -2)
+
+        # 边框和选中状态
+        if option.state & QStyle.State_Selected:
+            painter.fillRect(rect, QColor("#E3F2FD"))
+            painter.setPen(QPen(QColor("#2196F3"), 3))
         else:
-            self.setStyleSheet("ThumbnailWidget { border: 1px solid #ccc; }")
+            painter.setPen(QPen(QColor("#cccccc"), 1))
+        painter.drawRect(rect)
+
+        # 缩略图（保持宽高比居中）
+        image_rect = self.IMAGE_RECT.translated(option.rect.topLeft())
+        pixmap = index.data(Qt.DecorationRole)
+        if pixmap is not None and not pixmap.isNull():
+            size = pixmap.size().scaled(image_rect.size(), Qt.KeepAspectRatio)
+            target = QRect(0, 0, size.width(), size.height())
+            target.moveCenter(image_rect.center())
+            painter.drawPixmap(target, pixmap)
+
+        # 状态和文件名
+        keep = index.data(ThumbnailModel.KeepRole)
+        status_rect = QRect(rect.left(), image_rect.bottom() + 2, rect.width(), 14)
+        font = painter.font()
+        font.setBold(True)
+        painter.setFont(font)
+        painter.setPen(QColor("green") if keep else QColor("red"))
+        painter.drawText(status_rect, Qt.AlignCenter, "✓ 保留" if keep else "✗ 跳过")
+
+        font.setBold(False)
+        painter.setFont(font)
+        painter.setPen(option.palette.color(option.palette.Text))
+        name_rect = QRect(rect.left() + 4, status_rect.bottom(), rect.width() - 8, 14)
+        filename = option.fontMetrics.elidedText(index.data(Qt.DisplayRole),
+                                                 Qt.ElideMiddle, name_rect.width())
+        painter.drawText(name_rect, Qt.AlignCenter, filename)
 
-    def mousePressEvent(self, event):
-        """鼠标点击"""
-        self.clicked.emit(self.index)
+        painter.restore()
 
 
 class ThumbnailView(QWidget):
-    """缩略图视图"""
+    """缩略图视图
+
+    基于 QListView 的虚拟化网格：只绘制可见单元格，缩略图按需请求，
+    内存占用和绘制时间与图片数量无关。信号和方法中的 index 均为图片索引。
+    """
 
     image_selected = pyqtSignal(int)
 
-    def __init__(self):
+    def __init__(self, pixmap_provider=None):
         super().__init__()
-        self.thumbnails = []
         self.current_index = -1
+        self.model = ThumbnailModel(pixmap_provider)
 
         self.init_ui()
 
+    @property
+    def thumbnails_requested(self):
+        """需要生成缩略图的图片索引（信号）"""
+        return self.model.thumbnails_requested
+
     def init_ui(self):
         """初始化界面"""
         layout = QVBoxLayout(self)
@@ -84,56 +202,67 @@ class ThumbnailView(QWidget):
         title.setStyleSheet("font-size: 14px; font-weight: bold; padding: 5px;")
         layout.addWidget(title)
 
-        # 滚动区域
-        scroll = QScrollArea()
-        scroll.setWidgetResizable(True)
-        scroll.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
-
-        # 网格容器
-        self.container = QWidget()
-        self.grid_layout = QGridLayout(self.container)
-        self.grid_layout.setSpacing(10)
-
-        scroll.setWidget(self.container)
-        layout.addWidget(scroll)
-
-    def set_images(self, pixmaps, images_data):
-        """设置图片列表"""
-        # 清空现有
-        for i in reversed(range(self.grid_layout.count())):
-            self.grid_layout.itemAt(i).widget().setParent(None)
-        self.thumbnails.clear()
-
-        # 添加新缩略图
-        cols = 2  # 每行2个
-        for i, (pixmap, data) in enumerate(zip(pixmaps, images_data)):
-            filename = data['path'].split('/')[-1]
-            thumb = ThumbnailWidget(i, pixmap, filename, data['keep'])
-            thumb.clicked.connect(self.on_thumbnail_clicked)
-
-            row = i // cols
-            col = i % cols
-            self.grid_layout.addWidget(thumb, row, col)
-            self.thumbnails.append(thumb)
-
-    def on_thumbnail_clicked(self, index):
+        # 网格视图
+        self.list_view = QListView()
+        self.list_view.setViewMode(QListView.IconMode)
+        self.list_view.setResizeMode(QListView.Adjust)
+        self.list_view.setMovement(QListView.Static)
+        self.list_view.setUniformItemSizes(True)
+        self.list_view.setLayoutMode(QListView.Batched)
+        self.list_view.setBatchSize(500)
+        self.list_view.setSpacing(5)
+        self.list_view.setSelectionMode(QAbstractItemView.SingleSelection)
+        self.list_view.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
+        self.list_view.setItemDelegate(ThumbnailDelegate(self.list_view))
+        self.list_view.setModel(self.model)
+        self.list_view.clicked.connect(self.on_thumbnail_clicked)
+        layout.addWidget(self.list_view)
+
+    def set_state(self, state):
+        """设置图片列表及整理状态"""
+        self.current_index = -1
+        self.model.set_state(state)
+
+    def set_order(self, order):
+        """设置排序/筛选后的显示顺序，保持当前选中的图片"""
+        self.model.set_order(order)
+        self.set_current_index(self.current_index)
+
+    def visible_count(self):
+        """当前显示的图片数量"""
+        return self.model.rowCount()
+
+    def neighbor(self, index, step):
+        """按显示顺序相邻的图片索引，没有时返回 -1
+
+        index 未显示（已被筛选掉）时返回显示顺序中的第一张。
+        """
+        count = self.model.rowCount()
+        row = self.model.row_of(index)
+        if row < 0:
+            return self.model.index_at(0) if count else -1
+        row += step
+        return self.model.index_at(row) if 0 <= row < count else -1
+
+    def set_thumbnail(self, index):
+        """缩略图已生成，刷新对应单元格"""
+        self.model.thumbnail_updated(index)
+
+    def on_thumbnail_clicked(self, model_index):
         """缩略图被点击"""
-        self.image_selected.emit(index)
+        self.image_selected.emit(self.model.index_at(model_index.row()))
 
     def set_current_index(self, index):
-        """设置当前选中的索引"""
-        if self.current_index >= 0 and self.current_index < len(self.thumbnails):
-            self.thumbnails[self.current_index].set_selected(False)
-
+        """设置当前选中的图片"""
         self.current_index = index
-
-        if 0 <= index < len(self.thumbnails):
-            self.thumbnails[index].set_selected(True)
-            # 滚动到可见
-            # self.thumbnails[index].ensureVisible() # 如果需要
+        row = self.model.row_of(index)
+        if row >= 0:
+            model_index = self.model.index(row)
+            self.list_view.setCurrentIndex(model_index)
+            self.list_view.scrollTo(model_index)
+        else:
+            self.list_view.clearSelection()
 
     def update_keep_status(self, index, keep):
-        """更新保留状态"""
-        if 0 <= index < len(self.thumbnails):
-            filename = "img"  # 这里可以传入实际文件名
-            self.thumbnails[index].update_display(filename, keep)
\ No newline at end of file
+        """更新保留状态（状态本身保存在 CurationState 中）"""
+        self.model.keep_updated(index)
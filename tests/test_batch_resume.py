@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from PIL import Image
+
+from cli import DEFAULT_SETTINGS
+from core.batch_processor import BatchProcessor
+
+
+class CountingProcessor(BatchProcessor):
+    """记录实际处理（未复用）的图片"""
+
+    def __init__(self):
+        super().__init__()
+        self.processed = []
+
+    def process_image(self, input_path, *args, **kwargs):
+        self.processed.append(os.path.basename(input_path))
+        return super().process_image(input_path, *args, **kwargs)
+
+
+class ResumeTest(unittest.TestCase):
+    """续跑时只处理新增的图片，已有输出按新序号重命名"""
+
+    COLORS = {'a': 'blue', 'b': 'red', 'c': 'green', 'd': 'yellow', 'z': 'white'}
+
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp()
+        self.input_folder = os.path.join(self.work_dir, 'in')
+        self.output_folder = os.path.join(self.work_dir, 'out')
+        os.makedirs(self.input_folder)
+        os.makedirs(self.output_folder)
+        self.settings = dict(DEFAULT_SETTINGS, input_folder=self.input_folder,
+                             output_folder=self.output_folder, workers=1)
+
+    def tearDown(self):
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+
+    def add_images(self, names):
+        for name in names:
+            Image.new('RGB', (20, 20), self.COLORS[name]).save(
+                os.path.join(self.input_folder, f"{name}.png"))
+
+    def run_batch(self):
+        processor = CountingProcessor()
+        images = [(os.path.join(self.input_folder, name), 0)
+                  for name in sorted(os.listdir(self.input_folder))]
+        processor.process_batch(images, self.settings)
+        return processor.processed
+
+    def assert_outputs(self, names):
+        for i, name in enumerate(names, 1):
+            path = os.path.join(self.output_folder, f"train_{i:05d}.png")
+            with Image.open(path) as image:
+                self.assertEqual(image.convert('RGB').getpixel((0, 0)),
+                                 Image.new('RGB', (1, 1), self.COLORS[name]).getpixel((0, 0)))
+
+    def test_insert_reencodes_only_new_image(self):
+        self.add_images('bcd')
+        self.assertEqual(self.run_batch(), ['b.png', 'c.png', 'd.png'])
+
+        self.add_images('a')
+        self.assertEqual(self.run_batch(), ['a.png'])
+        self.assert_outputs('abcd')
+
+    def test_append_reencodes_only_new_image(self):
+        self.add_images('bcd')
+        self.run_batch()
+
+        self.add_images('z')
+        self.assertEqual(self.run_batch(), ['z.png'])
+        self.assert_outputs('bcdz')
+
+
+if __name__ == '__main__':
+    unittest.main()
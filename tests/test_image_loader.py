@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from PIL import Image
+
+from core.image_loader import ImageLoader
+
+
+class LoadPreviewTest(unittest.TestCase):
+    """大图预览按整数倍缩减，各种模式都能加载"""
+
+    # 至少为预览尺寸的 2 倍，触发 reduce
+    SIZE = (ImageLoader.PREVIEW_SIZE[0] * 2 + 100, ImageLoader.PREVIEW_SIZE[1] * 2)
+
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp()
+        self.loader = ImageLoader()
+
+    def tearDown(self):
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+
+    def assert_preview(self, image):
+        path = os.path.join(self.work_dir, f"{image.mode.replace(';', '_')}.png")
+        image.save(path)
+
+        preview, source_size = self.loader.load_preview(path)
+        self.assertIsNotNone(preview, image.mode)
+        self.assertEqual(source_size, self.SIZE)
+        self.assertEqual(preview.mode, 'RGB')
+        self.assertLessEqual(preview.width, self.SIZE[0] // 2)
+        return preview
+
+    def test_palette(self):
+        image = Image.new('P', self.SIZE, 1)
+        image.putpalette([0, 0, 0, 200, 100, 50])
+        self.assertEqual(self.assert_preview(image).getpixel((0, 0)), (200, 100, 50))
+
+    def test_bilevel(self):
+        preview = self.assert_preview(Image.new('1', self.SIZE, 1))
+        self.assertEqual(preview.getpixel((0, 0)), (255, 255, 255))
+
+    def test_gray_16bit(self):
+        self.assert_preview(Image.new('I;16', self.SIZE, 100))
+
+    def test_rgb(self):
+        preview = self.assert_preview(Image.new('RGB', self.SIZE, (10, 20, 30)))
+        self.assertEqual(preview.getpixel((0, 0)), (10, 20, 30))
+
+
+if __name__ == '__main__':
+    unittest.main()
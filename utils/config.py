@@ -9,6 +9,7 @@ class Config:
     """配置管理"""
 
     CONFIG_FILE = "config.json"
+    CACHE_ROOT = os.path.join(os.path.expanduser("~"), ".dataset_image_processor")
 
     @staticmethod
     def load():
@@ -28,4 +29,11 @@ class Config:
             with open(Config.CONFIG_FILE, 'w', encoding='utf-8') as f:
                 json.dump(config, f, indent=4, ensure_ascii=False)
         except Exception as e:
-            print(f"Error saving config: {e}")
\ No newline at end of file
+            print(f"Error saving config: {e}")
+
+    @staticmethod
+    def cache_dir(name):
+        """获取缓存子目录（不存在时自动创建）"""
+        path = os.path.join(Config.CACHE_ROOT, name)
+        os.makedirs(path, exist_ok=True)
+        return path